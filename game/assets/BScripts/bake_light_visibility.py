@@ -0,0 +1,185 @@
+#
+# Copyright 2012 Alex Fraser <alex@phatcore.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+'''
+Bakes a visibility table for a light network (see Scripts/lighting.py). The
+space around each node is divided into cells, and rays are cast from sample
+points in each cell to the nearby nodes. Like the rays cast in the game, only
+objects with a 'Ray' game property block the view.
+
+Run from the command line like this:
+
+    blender -b <level.blend> -P bake_light_visibility.py -- <network object>
+
+For help:
+
+    blender -b -P bake_light_visibility.py -- -h
+'''
+
+import json
+import math
+import os
+
+import bpy
+import mathutils
+
+# Same as LightNetwork.MERGE_THRESHOLD
+MERGE_THRESHOLD = 3.0
+# Same as LightNetwork.DEFAULT_VISIBILITY_TABLE
+DEFAULT_PATH = '//{scene}_{network}.lightvis.json'
+
+DEFAULT_CELL_SIZE = 2.0
+DEFAULT_RADIUS = 20.0
+
+# Sample points in each cell, as fractions of the cell size from its centre.
+SAMPLE_OFFSETS = [(0.0, 0.0, 0.0)] + [
+        (x, y, z) for x in (-0.25, 0.25) for y in (-0.25, 0.25)
+        for z in (-0.25, 0.25)]
+
+def find_nodes(ob):
+    '''Find the positions of the nodes of a light network, merging close
+    vertices in the same way as LightNetwork.construct_node_graph.'''
+    me = ob.data
+    mat = ob.matrix_world
+    nodes = []
+    for poly in me.polygons:
+        for i in poly.vertices:
+            pos = mat * me.vertices[i].co
+            for n in nodes:
+                if (pos - n).magnitude < MERGE_THRESHOLD:
+                    break
+            else:
+                nodes.append(pos)
+    return nodes
+
+def find_blockers(scene, network):
+    return [ob for ob in scene.objects
+            if ob.type == 'MESH' and ob is not network and
+            'Ray' in ob.game.properties]
+
+def ray_blocked(blockers, start, end):
+    for ob in blockers:
+        imat = ob.matrix_world.inverted()
+        lstart = imat * start
+        lend = imat * end
+        if bpy.app.version >= (2, 77, 0):
+            direction = lend - lstart
+            hit, _, _, _ = ob.ray_cast(lstart, direction.normalized(),
+                    direction.magnitude)
+        else:
+            _, _, index = ob.ray_cast(lstart, lend)
+            hit = index >= 0
+        if hit:
+            return True
+    return False
+
+def cells_near(pos, cell_size, radius):
+    r = int(math.ceil(radius / cell_size))
+    cx = int(math.floor(pos.x / cell_size))
+    cy = int(math.floor(pos.y / cell_size))
+    cz = int(math.floor(pos.z / cell_size))
+    for x in range(cx - r, cx + r + 1):
+        for y in range(cy - r, cy + r + 1):
+            for z in range(cz - r, cz + r + 1):
+                yield (x, y, z)
+
+def bake(network, cell_size, radius):
+    scene = bpy.context.scene
+    nodes = find_nodes(network)
+    blockers = find_blockers(scene, network)
+    print("Found %d nodes and %d blocking objects" % (len(nodes), len(blockers)))
+
+    # Find the nodes that are in range of each cell.
+    in_range = {}
+    for i, node in enumerate(nodes):
+        for cell in cells_near(node, cell_size, radius):
+            centre = (mathutils.Vector(cell) + mathutils.Vector((0.5, 0.5, 0.5))) * cell_size
+            if (centre - node).magnitude > radius:
+                continue
+            try:
+                in_range[cell].append(i)
+            except KeyError:
+                in_range[cell] = [i]
+
+    cells = {}
+    for n, (cell, indices) in enumerate(in_range.items()):
+        if n % 1000 == 0:
+            print("Cell %d of %d" % (n, len(in_range)))
+        centre = (mathutils.Vector(cell) + mathutils.Vector((0.5, 0.5, 0.5))) * cell_size
+        samples = [centre + mathutils.Vector(o) * cell_size for o in SAMPLE_OFFSETS]
+        visible = []
+        for i in indices:
+            nVisible = 0
+            for sample in samples:
+                if not ray_blocked(blockers, nodes[i], sample):
+                    nVisible += 1
+            # Most of the cell must be able to see the node, so that the
+            # lighting doesn't flicker near walls.
+            if nVisible * 2 > len(samples):
+                visible.append(i)
+        cells['%d,%d,%d' % cell] = visible
+
+    return {
+        'cell_size': cell_size,
+        'nodes': [list(n) for n in nodes],
+        'cells': cells,
+        }
+
+def run_batch():
+    import argparse
+    import sys
+
+    parser = argparse.ArgumentParser(
+        description="Bake light network visibility.",
+        usage="blender -b <infile> -P <this script> -- [args] <network>")
+    parser.add_argument(
+        '--cell-size', type=float, default=DEFAULT_CELL_SIZE,
+        help="The size of each cell.")
+    parser.add_argument(
+        '--radius', type=float, default=DEFAULT_RADIUS,
+        help="How far from each node to bake visibility.")
+    parser.add_argument(
+        '--output', default=None,
+        help="The file to write to. Defaults to %s" % DEFAULT_PATH)
+    parser.add_argument(
+        'network',
+        help="The name of the light network object.")
+
+    try:
+        arg_sep = sys.argv.index('--')
+    except ValueError:
+        print("Error: missing arguments.")
+        parser.print_help()
+        sys.exit(1)
+
+    args = parser.parse_args(args=sys.argv[arg_sep + 1:])
+    network = bpy.data.objects[args.network]
+    if args.output is not None:
+        path = args.output
+    else:
+        path = DEFAULT_PATH.format(scene=bpy.context.scene.name,
+                network=network.name)
+    path = bpy.path.abspath(path)
+
+    table = bake(network, args.cell_size, args.radius)
+    with open(path, 'w') as f:
+        json.dump(table, f)
+    print("Wrote visibility of %d cells to %s" % (len(table['cells']),
+            os.path.relpath(path)))
+
+if __name__ == "__main__":
+    run_batch()
@@ -0,0 +1,280 @@
+import sys
+import os
+import types
+
+import mathutils
+
+#
+# Replays a camera recording (see Scripts/camera_replay.py) without the game
+# engine, and reports the cost of each frame and how far the camera strayed
+# from the recording.
+#
+# The game engine is replaced with a minimal stand-in, so this can be run
+# from Blender:
+#
+# blender --factory-startup -b -P replay_camera.py -- <RECORDING>
+#
+# Or with any Python 3 that has mathutils:
+#
+# python3 replay_camera.py <RECORDING>
+#
+
+ASSETS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+class Anything:
+    '''Stands in for any part of the engine that the cameras don't use.'''
+    def __call__(self, *args, **kwargs):
+        return Anything()
+    def __getattr__(self, name):
+        return Anything()
+    def __iter__(self):
+        return iter(())
+    def __bool__(self):
+        return False
+
+class StubModule(types.ModuleType):
+    def __getattr__(self, name):
+        if name.startswith('__'):
+            raise AttributeError(name)
+        return Anything()
+
+class ObjectList(list):
+    '''Like CListValue: can be indexed by name.'''
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            for ob in self:
+                if ob.name == key:
+                    return ob
+            raise KeyError(key)
+        return list.__getitem__(self, key)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __contains__(self, key):
+        if isinstance(key, str):
+            return self.get(key) is not None
+        return list.__contains__(self, key)
+
+class FakeGameObject:
+    '''A game object with just enough behaviour for the cameras. Subclasses
+    are constructed from an existing object, as in the game engine.'''
+
+    def __new__(cls, old_owner=None):
+        ob = object.__new__(cls)
+        if isinstance(old_owner, FakeGameObject):
+            ob.__dict__.update(old_owner.__dict__)
+            ob.scene.objects.remove(old_owner)
+            ob.scene.objects.append(ob)
+            old_owner.invalid = True
+            return ob
+
+        ob.name = old_owner
+        ob.scene = None
+        ob.invalid = False
+        ob.visible = True
+        ob.color = mathutils.Vector((1, 1, 1, 1))
+        ob.parent = None
+        ob.children = ObjectList()
+        ob.localCoordinates = False
+        ob.touchedObject = None
+        ob.lens = 22.0
+        ob.near = 0.1
+        ob.worldLinearVelocity = mathutils.Vector((0, 0, 0))
+        ob._pos = mathutils.Vector((0, 0, 0))
+        ob._orn = mathutils.Matrix.Identity(3)
+        ob._props = {}
+        return ob
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def __repr__(self):
+        return self.name
+
+    @property
+    def worldPosition(self):
+        return self._pos
+
+    @worldPosition.setter
+    def worldPosition(self, value):
+        self._pos = mathutils.Vector(value)
+
+    @property
+    def worldOrientation(self):
+        return self._orn
+
+    @worldOrientation.setter
+    def worldOrientation(self, value):
+        if hasattr(value, 'to_matrix'):
+            value = value.to_matrix()
+        self._orn = mathutils.Matrix(value).to_3x3()
+
+    @property
+    def worldTransform(self):
+        return mathutils.Matrix.Translation(self._pos) * self._orn.to_4x4()
+
+    def __getitem__(self, name):
+        return self._props[name]
+
+    def __setitem__(self, name, value):
+        self._props[name] = value
+
+    def __contains__(self, name):
+        return name in self._props
+
+    def get(self, name, default=None):
+        return self._props.get(name, default)
+
+    def getPropertyNames(self):
+        return list(self._props.keys())
+
+    def getAxisVect(self, vect):
+        return self._orn * mathutils.Vector(vect)
+
+    def getDistanceTo(self, other):
+        if hasattr(other, 'worldPosition'):
+            other = other.worldPosition
+        return (mathutils.Vector(other) - self._pos).magnitude
+
+    def alignAxisToVect(self, vect, axis=2, fac=1.0):
+        # Same method as KX_GameObject::AlignAxisToVect.
+        vect = mathutils.Vector(vect)
+        if vect.length_squared == 0.0 or fac <= 0.0:
+            return
+        vect.normalize()
+        orn = self._orn
+        if fac < 1.0:
+            vect = vect * fac + orn.col[axis] * (1.0 - fac)
+            vect.normalize()
+
+        # Pivot around another axis, unless it's parallel to the new one.
+        def pivot(first, second):
+            p = orn.col[first].copy()
+            if abs(vect.dot(p)) > 1.0 - 1.0e-6:
+                p = orn.col[second].copy()
+            return p
+
+        if axis == 0:
+            x = vect
+            y = pivot(2, 1).cross(x)
+            z = x.cross(y)
+        elif axis == 1:
+            y = vect
+            z = pivot(0, 2).cross(y)
+            x = y.cross(z)
+        else:
+            z = vect
+            x = pivot(1, 0).cross(z)
+            y = z.cross(x)
+        axes = (x, y, z)
+        for v in axes:
+            v.normalize()
+
+        m = mathutils.Matrix.Identity(3)
+        for i in range(3):
+            m.col[i] = axes[i]
+        self._orn = m
+
+    def rayCast(self, *args):
+        # Scripts.camera.ray_cast is replaced by the replayer, so this should
+        # only be reached by code that isn't being replayed.
+        return None, None, None
+
+    def setParent(self, parent, *args):
+        self.removeParent()
+        self.parent = parent
+        parent.children.append(self)
+
+    def removeParent(self):
+        if self.parent is not None:
+            self.parent.children.remove(self)
+        self.parent = None
+
+    def endObject(self):
+        self.invalid = True
+        self.removeParent()
+        if self in self.scene.objects:
+            self.scene.objects.remove(self)
+
+    def playAction(self, *args, **kwargs):
+        pass
+
+class FakeScene:
+    def __init__(self):
+        self.name = 'ReplayScene'
+        self.objects = ObjectList()
+        self.objectsInactive = ObjectList()
+        self.active_camera = None
+        self.suspended = False
+
+    def addObject(self, name, other=None, time=0):
+        ob = FakeGameObject(name)
+        ob.scene = self
+        if isinstance(other, str):
+            other = self.objects.get(other)
+        if other is not None:
+            ob.worldPosition = other.worldPosition
+            ob.worldOrientation = other.worldOrientation
+        self.objects.append(ob)
+        return ob
+
+def install_stub_engine():
+    '''Register stand-ins for the bge and aud modules, and make the Scripts
+    package importable without running its initialisation code.'''
+    scene = FakeScene()
+
+    bge = StubModule('bge')
+    bge.types = StubModule('bge.types')
+    for name in ('KX_GameObject', 'KX_Camera', 'KX_LightObject',
+            'BL_ArmatureObject', 'KX_FontObject'):
+        setattr(bge.types, name, type(name, (FakeGameObject,), {}))
+    bge.logic = StubModule('bge.logic')
+    bge.logic.getCurrentScene = lambda: scene
+    bge.logic.getSceneList = lambda: [scene]
+    bge.logic.getLogicTicRate = lambda: 60.0
+    bge.logic.expandPath = lambda path: path
+    bge.logic.globalDict = {}
+    for name in ('render', 'events', 'constraints', 'texture'):
+        setattr(bge, name, StubModule('bge.' + name))
+    for name in ('logic', 'types', 'render', 'events', 'constraints',
+            'texture'):
+        sys.modules['bge.' + name] = getattr(bge, name)
+    sys.modules['bge'] = bge
+
+    aud = StubModule('aud')
+    class error(Exception):
+        pass
+    aud.error = error
+    def device():
+        raise error('No audio device in replay')
+    aud.device = device
+    sys.modules['aud'] = aud
+
+    scripts = types.ModuleType('Scripts')
+    scripts.__path__ = [os.path.join(ASSETS_DIR, 'Scripts')]
+    sys.modules['Scripts'] = scripts
+
+def replay(path):
+    import Scripts.camera_replay
+    frames = Scripts.camera_replay.load_recording(path)
+    replayer = Scripts.camera_replay.Replayer(frames)
+    replayer.run()
+    print(replayer.report())
+
+if __name__ == "__main__":
+    try:
+        arg_separator = sys.argv.index('--')
+        args = sys.argv[arg_separator + 1:]
+    except ValueError:
+        args = sys.argv[1:]
+    if len(args) != 1:
+        print("Usage: replay_camera.py <RECORDING>")
+        sys.exit(1)
+
+    sys.path.insert(0, ASSETS_DIR)
+    install_stub_engine()
+    replay(args[0])
@@ -15,6 +15,7 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 #
 
+import os
 import sys
 
 print('Using Python', sys.version)
@@ -40,3 +41,7 @@ Scripts.ui.HUDState()
 
 Scripts.input.create_controls()
 Scripts.input.apply_bindings()
+
+if 'CARGO_CAMERA_RECORDING' in os.environ:
+    import Scripts.camera_replay
+    Scripts.camera_replay.Recorder().start(os.environ['CARGO_CAMERA_RECORDING'])
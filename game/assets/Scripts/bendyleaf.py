@@ -18,14 +18,66 @@
 import bge
 
 import bat.bats
+import bat.containers
 import bat.utils
 import bat.bmath
 
+import Scripts.foliage
+import Scripts.scheduler
+
+class LeafSpring(metaclass=bat.bats.Singleton):
+    '''Integrates the bend angle of all moving BendyLeaves together. Leaves are
+    woken when their target influence changes, and sleep once they come to
+    rest.
+
+    The awake leaves of each scene are stepped once per logic tic by a
+    scheduled task, rather than by one of the leaves; so leaves can be ended
+    (e.g. by an LOD tree) without stopping the others.'''
+
+    def __init__(self):
+        self.leaves = bat.containers.SafeSet()
+        self.tasks = {}
+
+    def wake(self, leaf):
+        self.leaves.add(leaf)
+        scene = leaf.scene
+        task = self.tasks.get(scene)
+        if task is None or not task.pending:
+            self.schedule(scene)
+
+    def schedule(self, scene):
+        for sce in list(self.tasks.keys()):
+            if sce.invalid:
+                del self.tasks[sce]
+        self.tasks[scene] = Scripts.scheduler.Scheduler().call_later(1,
+                lambda: self.update(scene), scene=scene)
+
+    def update(self, scene):
+        '''Step all awake leaves in a scene by one tic.'''
+        awake = False
+        for leaf in list(self.leaves):
+            if leaf.scene != scene:
+                continue
+            if leaf.step():
+                awake = True
+            else:
+                self.leaves.discard(leaf)
+
+        if awake:
+            self.schedule(scene)
+        else:
+            self.tasks.pop(scene, None)
+
 class BendyLeaf(bat.bats.BX_GameObject, bge.types.BL_ArmatureObject):
     _prefix = ""
 
     S_SENSING = 1
-    S_UPDATING = 2
+
+    # Changes in influence smaller than this don't wake the leaf.
+    INFLUENCE_EPSILON = 0.001
+    # The pose is only updated when the bend angle (i.e. the action frame)
+    # changes by this much.
+    POSE_QUANTUM = 0.1
 
     def __init__(self, old_owner):
         self.skin = self.find_descendant([('Type', 'Skin')])
@@ -33,7 +85,11 @@ class BendyLeaf(bat.bats.BX_GameObject, bge.types.BL_ArmatureObject):
         self.target_influence = 0.0
         self.influence = 0.0
         self.velocity = 0.0
-        self.add_state(BendyLeaf.S_UPDATING)
+        self.pose_frame = None
+        LeafSpring().wake(self)
+
+        if not Scripts.foliage.has_collision_sensor(self):
+            Scripts.foliage.FoliageCollider().add(self)
 
     @bat.bats.expose
     @bat.utils.controller_cls
@@ -50,6 +106,12 @@ class BendyLeaf(bat.bats.BX_GameObject, bge.types.BL_ArmatureObject):
             for ob in s.hitObjectList:
                 hit_obs.add(ob)
 
+        self.set_colliders(hit_obs)
+
+    def get_collision_reach(self):
+        return max(self['MinDist'], self['MaxDist'])
+
+    def set_colliders(self, hit_obs):
         #
         # Pass two: add up the effect of all touching objects.
         #
@@ -57,15 +119,16 @@ class BendyLeaf(bat.bats.BX_GameObject, bge.types.BL_ArmatureObject):
         for ob in hit_obs:
             distance = (ob.worldPosition - self.worldPosition).magnitude
             influence = bat.bmath.unlerp(self['MinDist'], self['MaxDist'], distance)
-            influence = influence * ob['DynamicMass']
+            influence = influence * ob.get('DynamicMass', 0.0)
             total_influence = total_influence + influence
         total_influence = total_influence * self['InfluenceMultiplier']
-        self.target_influence = total_influence
-
-        self.add_state(BendyLeaf.S_UPDATING)
+        if abs(total_influence - self.target_influence) > BendyLeaf.INFLUENCE_EPSILON:
+            self.target_influence = total_influence
+            LeafSpring().wake(self)
 
-    @bat.bats.expose
-    def update(self):
+    def step(self):
+        '''Move the leaf towards its target pose by one frame.
+        @return: False if the leaf is at rest.'''
         self.influence = bat.bmath.lerp(self.influence, self.target_influence, 0.5)
         target_bend_angle = bat.bmath.lerp(self['MinAngle'], self['MaxAngle'], self.influence)
 
@@ -74,8 +137,12 @@ class BendyLeaf(bat.bats.BX_GameObject, bge.types.BL_ArmatureObject):
                 self.bend_angle, self.velocity,
                 difference * self['acceleration'], self['damping'])
 
-        self.playAction('LeafBend', self.bend_angle, self.bend_angle)
+        frame = round(self.bend_angle / BendyLeaf.POSE_QUANTUM) * BendyLeaf.POSE_QUANTUM
+        if frame != self.pose_frame:
+            self.playAction('LeafBend', frame, frame)
+            self.pose_frame = frame
 
         if abs(self.velocity) < 0.0001 and abs(difference) < 0.0001:
             # At rest
-            self.rem_state(BendyLeaf.S_UPDATING)
+            return False
+        return True
@@ -31,10 +31,17 @@ import bat.event
 import bat.render
 
 import Scripts.director
+import Scripts.scheduler
 import bat.store
 
+def ray_cast(ob, *args):
+    '''Cast a ray from ob; see KX_GameObject.rayCast. The cameras cast all
+    of their rays through this function, so that they can be recorded and
+    replayed by Scripts.camera_replay.'''
+    return ob.rayCast(*args)
+
 def hasLineOfSight(ob, other):
-    hitOb, _, _ = ob.rayCast(other, None, 0.0, 'Ray', 1, 1, 0)
+    hitOb, _, _ = ray_cast(ob, other, None, 0.0, 'Ray', 1, 1, 0)
     return (hitOb is None)
 
 class AutoCamera(metaclass=bat.bats.Singleton):
@@ -52,6 +59,10 @@ class AutoCamera(metaclass=bat.bats.Singleton):
     BLUR_MULT_ACCEL = 0.001
     BLUR_MULT_MAX = 10.0
     BLUR_MULT_DAMP = 0.1
+    # Observers are only notified when the camera moves or turns by more than
+    # these amounts.
+    MOVE_EPSILON = 0.001
+    TURN_EPSILON = 0.0001
     # Blur settings vary based on camera type.
     MAX_BLUR = {
             'FIRST': 0,
@@ -77,6 +88,15 @@ class AutoCamera(metaclass=bat.bats.Singleton):
         self.instantCut = False
         self.errorReported = False
 
+        # Set to True on frames when the camera has moved; see MOVE_EPSILON.
+        self.transformChanged = False
+        self.lastPos = None
+        self.lastOrn = None
+        self.audioDevice = None
+
+        # See Scripts.camera_replay.Recorder.
+        self.recorder = None
+
         bat.event.EventBus().add_listener(self)
         bat.event.EventBus().replay_last(self, 'TeleportSnail')
 
@@ -101,6 +121,7 @@ class AutoCamera(metaclass=bat.bats.Singleton):
 
         AutoCamera.log.info('Setting actual camera to %s', camera)
         self.camera = camera
+        self.lastPos = None
         self.defaultLens = camera.lens
         bat.utils.get_scene(camera).active_camera = camera
 
@@ -113,10 +134,15 @@ class AutoCamera(metaclass=bat.bats.Singleton):
 
     @bat.bats.expose
     def update(self):
-        '''Update the location of the camera. observers will be notified. The
-        camera should have a controller set up to call this once per frame.
+        '''Update the location of the camera. If it has moved, observers will
+        be notified. The camera should have a controller set up to call this
+        once per frame.
         '''
+        self._update()
+        if self.recorder is not None:
+            self.recorder.record_frame(self)
 
+    def _update(self):
         if not self.camera:
             return
 
@@ -142,7 +168,7 @@ class AutoCamera(metaclass=bat.bats.Singleton):
         if not self.instantCut:
             # ... but if there's an object in the way, teleport to the nearest
             # safe position.
-            ob, hitPoint, _ = self.camera.rayCast(currentGoal, self.camera, 0.0,
+            ob, hitPoint, _ = ray_cast(self.camera, currentGoal, self.camera, 0.0,
                 'Ray', True, True, False)
             if ob is not None:
                 vectTo = hitPoint - currentGoal.worldPosition
@@ -175,17 +201,40 @@ class AutoCamera(metaclass=bat.bats.Singleton):
         # Update depth of field (blur).
         self._update_focal_depth(False, max_blur)
 
+        self.transformChanged = self._check_transform()
+        if not self.transformChanged:
+            return
+
+        self._update_listener()
+        for ob in self.observers:
+            ob.on_camera_moved(self)
+
+    def _check_transform(self):
+        '''Test whether the camera has moved since the last time this was
+        called.'''
+        pos = self.camera.worldPosition
+        orn = self.camera.worldOrientation
+        if self.lastPos is not None:
+            if (pos - self.lastPos).length_squared < AutoCamera.MOVE_EPSILON ** 2:
+                diff = orn - self.lastOrn
+                if all(row.length_squared < AutoCamera.TURN_EPSILON ** 2
+                        for row in diff):
+                    return False
+        self.lastPos = pos.copy()
+        self.lastOrn = orn.copy()
+        return True
+
+    def _update_listener(self):
         try:
-            dev = aud.device()
+            if self.audioDevice is None:
+                self.audioDevice = aud.device()
+            dev = self.audioDevice
             dev.listener_location = self.camera.worldPosition
             dev.listener_orientation = self.camera.worldOrientation.to_quaternion()
             dev.listener_velocity = (0.0, 0.0, 0.0)
         except aud.error:
             #AutoCamera.log.warn("Can't set audio listener location: %s", e)
-            pass
-
-        for ob in self.observers:
-            ob.on_camera_moved(self)
+            self.audioDevice = None
 
     def _update_focal_depth(self, instant, max_blur):
         focalPoint = None
@@ -257,6 +306,8 @@ class AutoCamera(metaclass=bat.bats.Singleton):
 
         # Add the goal to the queue.
         self.queue.push(goal, goal['Priority'])
+        if self.recorder is not None:
+            self.recorder.record_goal(goal)
 
         if self.queue.top() == goal and goal['InstantCut']:
             # Goal is on top of the stack: it will be switched to next
@@ -267,7 +318,7 @@ class AutoCamera(metaclass=bat.bats.Singleton):
                 self.instantCut = True
 
         if self.instantCut:
-            self.update()
+            self._update()
         self.errorReported = False
 
     @bat.bats.expose
@@ -297,7 +348,7 @@ class AutoCamera(metaclass=bat.bats.Singleton):
 
         self.queue.discard(goal)
         if self.instantCut:
-            self.update()
+            self._update()
 
     @bat.bats.expose
     @bat.utils.owner_cls
@@ -328,6 +379,8 @@ class AutoCamera(metaclass=bat.bats.Singleton):
         # No need to have remove_observer; that happens automatically when the
         # observer dies.
         self.observers.add(observer)
+        # Make sure the new observer is notified on the next update.
+        self.lastPos = None
 
     def on_teleport(self, spawn_point):
         if isinstance(spawn_point, str):
@@ -553,7 +606,7 @@ class OrbitCamera(bat.impulse.Handler, bat.bats.BX_GameObject, bge.types.KX_Game
     def cast_ray(self, origin, direction, lastDist, maxDist):
         through = origin + direction
 
-        hitOb, hitPoint, hitNorm = self.rayCast(
+        hitOb, hitPoint, hitNorm = ray_cast(self,
             through,        # obTo
             origin,            # obFrom
             maxDist,        # dist
@@ -695,6 +748,13 @@ class PathCamera(bat.bats.BX_GameObject, bge.types.KX_GameObject):
     # The maximum height difference between two consecutive targets. This
     # smoothes off the path as the actor goes under a ceiling.
     ZOFFSET_INCREMENT = MIN_DIST * 0.5
+    # The number of nodes that a single ceiling height can influence when
+    # smoothing. Heights never exceed ZOFFSET, so nodes further apart than this
+    # can't affect each other.
+    ZOFFSET_RADIUS = int(math.ceil(ZOFFSET / ZOFFSET_INCREMENT))
+    # The distance a parented node must move before its ceiling is measured
+    # again.
+    CEILING_TOLERANCE = 0.05
 
     # The number of consecutive nodes that must be seen before being accepted.
     # If this is too low, the camera will clip through sharp corners. 
@@ -711,6 +771,9 @@ class PathCamera(bat.bats.BX_GameObject, bge.types.KX_GameObject):
     # Distance to project predictive node.
     PREDICT_FWD = 20.0
     PREDICT_UP = 50.0
+    # The distance the camera or a node must move before the line of sight
+    # between them is tested again.
+    VISIBILITY_TOLERANCE = 0.2
 
     class CameraNode:
         '''A single point in a path used by the CameraPathGoal. These act as
@@ -726,40 +789,107 @@ class PathCamera(bat.bats.BX_GameObject, bge.types.KX_GameObject):
         def __init__(self):
             # Defines the location of the way point. Using a way point allows the
             # node to parented to an object.
-            self.owner = bat.utils.add_object('PointMarker')
-            if not PathCamera.CameraNode.log.isEnabledFor(10):
-                self.owner.visible = False
-            else:
-                self.marker = bat.utils.add_object("PointMarker")
-                self.marker.color = bat.render.BLUE
-                self.marker.visible = True
-                self.owner.visible = True
+            self.owner = None
+            self.marker = None
+            self.recycle()
+
+        def _create_markers(self):
+            if self.owner is None or self.owner.invalid:
+                self.owner = bat.utils.add_object('PointMarker')
+                self.owner.visible = PathCamera.CameraNode.log.isEnabledFor(10)
+            if PathCamera.CameraNode.log.isEnabledFor(10):
+                if self.marker is None or self.marker.invalid:
+                    self.marker = bat.utils.add_object("PointMarker")
+                    self.marker.color = bat.render.BLUE
+                    self.marker.visible = True
+
+        def recycle(self):
+            '''Prepare this node to be used at a new location. The marker
+            objects are kept, but they are recreated if they have died with an
+            object they were attached to.'''
+            self._create_markers()
+            if self.owner.parent is not None:
+                self.owner.removeParent()
 
             # It is an error to access these next two before calling update().
             self.ceilingHeight = None
             self.target = None
+            # The unsmoothed ceiling height, and the transform it was measured
+            # from.
+            self.rawCeilingHeight = None
+            self.measuredPos = None
+            self.measuredUp = None
+
+            # Cached result of is_visible_from, and the positions it was
+            # computed for.
+            self.visible = None
+            self.visFrom = None
+            self.visPos = None
+            self.visTarget = None
+
+        def update(self, force=False):
+            '''Measure the height of the ceiling above this node. Ceilings are
+            assumed to be static, so the measurement is only taken once - unless
+            the node is parented to something that has moved, or force is True.
+
+            @return: True if the ceiling height was measured.
+            '''
+            if not force and self.rawCeilingHeight is not None:
+                if self.owner.parent is None or not self._has_moved():
+                    return False
 
-        def update(self):
             self.target = bat.bmath.ZAXIS.copy()
             self.target *= PathCamera.ZOFFSET
             self.target = bat.bmath.to_world(self.owner, self.target)
-            hitOb, hitPoint, _ = self.owner.rayCast(
+            hitOb, hitPoint, _ = ray_cast(self.owner,
                 self.target, None, 0.0, 'Ray', 1, 1, 0)
 
             if hitOb:
                 vec = hitPoint - self.owner.worldPosition
-                self.setCeilingHeight(vec.magnitude)
+                self.rawCeilingHeight = vec.magnitude
             else:
-                self.setCeilingHeight(PathCamera.ZOFFSET)
+                self.rawCeilingHeight = PathCamera.ZOFFSET
+            self.setCeilingHeight(self.rawCeilingHeight)
+
+            self.measuredPos = self.owner.worldPosition.copy()
+            self.measuredUp = self.owner.getAxisVect(bat.bmath.ZAXIS)
+            return True
+
+        def _has_moved(self):
+            tolerance = PathCamera.CEILING_TOLERANCE ** 2
+            up = self.owner.getAxisVect(bat.bmath.ZAXIS)
+            return ((self.owner.worldPosition - self.measuredPos).length_squared > tolerance or
+                    (up - self.measuredUp).length_squared > tolerance)
 
         def get_target(self):
             bias = self.ceilingHeight / PathCamera.ZOFFSET
             bias *= PathCamera.CEILING_AVOIDANCE_BIAS
             return bat.bmath.lerp(self.owner.worldPosition, self.target, bias)
 
+        def is_visible_from(self, ob):
+            '''Test whether both this node and its target can be seen from ob.
+            The result is cached: the rays are only cast again once ob, the
+            node or its target have moved further than VISIBILITY_TOLERANCE.'''
+            pos = self.owner.worldPosition
+            target = self.get_target()
+            if self.visible is not None:
+                tolerance = PathCamera.VISIBILITY_TOLERANCE ** 2
+                if ((ob.worldPosition - self.visFrom).length_squared < tolerance and
+                        (pos - self.visPos).length_squared < tolerance and
+                        (target - self.visTarget).length_squared < tolerance):
+                    return self.visible
+
+            self.visible = (hasLineOfSight(ob, self.owner) and
+                    hasLineOfSight(ob, target))
+            self.visFrom = ob.worldPosition.copy()
+            self.visPos = pos.copy()
+            self.visTarget = target
+            return self.visible
+
         def destroy(self):
-            self.owner.endObject()
-            if PathCamera.CameraNode.log.isEnabledFor(10):
+            if not self.owner.invalid:
+                self.owner.endObject()
+            if self.marker is not None and not self.marker.invalid:
                 self.marker.endObject()
 
         def setCeilingHeight(self, height):
@@ -767,13 +897,67 @@ class PathCamera(bat.bats.BX_GameObject, bge.types.KX_GameObject):
             if PathCamera.CameraNode.log.isEnabledFor(10):
                 self.marker.worldPosition = self.get_target()
 
+    class NodeRing:
+        '''A fixed-capacity sequence of CameraNodes, ordered from newest to
+        oldest. All nodes are created up-front; pushing a new node recycles the
+        oldest one once the ring is full.'''
+
+        def __init__(self, capacity):
+            self.nodes = [PathCamera.CameraNode() for _ in range(capacity)]
+            # Index of the newest node.
+            self.start = 0
+            self.length = 0
+
+        def __len__(self):
+            return self.length
+
+        def __getitem__(self, i):
+            if i < 0 or i >= self.length:
+                raise IndexError("NodeRing index out of range")
+            return self.nodes[(self.start + i) % len(self.nodes)]
+
+        def __iter__(self):
+            capacity = len(self.nodes)
+            for i in range(self.length):
+                yield self.nodes[(self.start + i) % capacity]
+
+        def is_full(self):
+            return self.length == len(self.nodes)
+
+        def push(self):
+            '''Make a node the newest in the sequence. If the ring is full, the
+            oldest node is reused.
+            @return: The node, ready to be positioned.'''
+            self.start = (self.start - 1) % len(self.nodes)
+            self.length = min(self.length + 1, len(self.nodes))
+            node = self.nodes[self.start]
+            node.recycle()
+            return node
+
+        def prune(self):
+            '''Remove nodes whose markers have died. This happens when the
+            object they were attached to is deleted.
+            @return: True if any nodes were removed.'''
+            live = [n for n in self if not n.owner.invalid]
+            if len(live) == self.length:
+                return False
+            spare = [n for n in self.nodes if n not in live]
+            self.nodes = live + spare
+            self.start = 0
+            self.length = len(live)
+            return True
+
+        def destroy(self):
+            for node in self.nodes:
+                node.destroy()
+
     target = bat.containers.weakprop('target')
 
     def __init__(self, old_owner):
-        # A list of CameraNodes. Must use a safe list here, because the nodes
-        # attach themselves to nearby objects as children - and if one of those
-        # objects is deleted, the node will be too.
-        self.path = bat.containers.SafeList()
+        # The CameraNodes that make up the path, newest first. Nodes attach
+        # themselves to nearby objects as children - so if one of those objects
+        # is deleted, the node will be pruned.
+        self.path = PathCamera.NodeRing(PathCamera.MAX_NODES)
         self.pathHead = PathCamera.CameraNode()
         self.linV = bat.bmath.ZEROVEC.copy()
 
@@ -905,7 +1089,7 @@ class PathCamera(bat.bats.BX_GameObject, bge.types.KX_GameObject):
         ba.normalize()
         projectedPoint = a.owner.worldPosition + (ba * PathCamera.PREDICT_FWD)
 
-        hitOb, hitPoint, _ = self.rayCast(
+        hitOb, hitPoint, _ = ray_cast(self,
             projectedPoint, a.owner, 0.0, 'Ray', 1, 1, 0)
         if hitOb is not None:
             vect = hitPoint - a.owner.worldPosition
@@ -934,7 +1118,7 @@ class PathCamera(bat.bats.BX_GameObject, bge.types.KX_GameObject):
             upAxis = rotAxis.cross(ba)
             pp2 = projectedPoint - (upAxis * PathCamera.PREDICT_FWD)
 
-            hitOb, hitPoint, _ = self.rayCast(
+            hitOb, hitPoint, _ = ray_cast(self,
                 pp2, projectedPoint, 0.0, 'Ray', 1, 1, 0)
             if hitOb is not None:
                 vect = hitPoint - projectedPoint
@@ -974,34 +1158,81 @@ class PathCamera(bat.bats.BX_GameObject, bge.types.KX_GameObject):
         '''Find the next point that the camera should advance towards.'''
 
         # Try to go straight to the actor.
-        nFound = 0
         node = self.pathHead
-        target = node.get_target()
-        if (hasLineOfSight(self, node.owner) and
-            hasLineOfSight(self, target)):
+        if node.is_visible_from(self):
             return node, 0.0
 
         # Actor is obscured; find a good way point.
-        nSearched = 0
-        for currentNode in self.path:
-            nSearched += 1
+        index = self._searchVisibleRun()
+
+        if index is None:
+            nSearched = len(self.path)
+        else:
+            node = self.path[index]
+            nSearched = index + 1
 
-            currentTarget = currentNode.get_target()
+        distance = nSearched * self.MIN_DIST
+        if len(self.path) > 0:
+            distance += self.pathHead.owner.getDistanceTo(self.path[0].owner)
+        return node, distance
 
-            if (not hasLineOfSight(self, currentNode.owner) or
-                not hasLineOfSight(self, currentTarget)):
+    def _searchVisibleRun(self):
+        '''Find the first run of NODE_DELAY visible nodes. Any such run must
+        contain a node whose index is a multiple of NODE_DELAY, so only those
+        nodes are probed; when a probe is visible, the run around it is
+        measured by walking back to its start and forward to its end. The
+        result is the same as _scanVisibleRun, but most hidden nodes are never
+        tested.
+
+        @return: The index of the last node in the run, or None if there is no
+                such run.
+        '''
+        path = self.path
+        n = len(path)
+        stride = max(self.NODE_DELAY, 1)
+
+        probe = 0
+        while probe < n:
+            if not path[probe].is_visible_from(self):
+                probe += stride
+                continue
+
+            # The nodes since the last probe haven't been tested yet, so the
+            # run may start before this one.
+            start = probe
+            while start > 0 and path[start - 1].is_visible_from(self):
+                start -= 1
+
+            end = start + self.NODE_DELAY - 1
+            i = probe + 1
+            while i <= end and i < n and path[i].is_visible_from(self):
+                i += 1
+            if i > end:
+                return end
+
+            # Too short; path[i] is hidden (or past the end). Carry on from
+            # the next probe after it.
+            probe = (i // stride + 1) * stride
+        return None
+
+    def _scanVisibleRun(self):
+        '''Find the first run of NODE_DELAY visible nodes by testing every node
+        in turn. This gives the same result as _searchVisibleRun, but is
+        slower; it is kept as a reference for it.
+
+        @return: The index of the last node in the run, or None if there is no
+                such run.
+        '''
+        nFound = 0
+        for i, currentNode in enumerate(self.path):
+            if not currentNode.is_visible_from(self):
                 nFound = 0
                 continue
 
             nFound += 1
             if nFound >= self.NODE_DELAY:
-                node = currentNode
-                break
-
-        distance = nSearched * self.MIN_DIST
-        if len(self.path) > 0:
-            distance += self.pathHead.owner.getDistanceTo(self.path[0].owner)
-        return node, distance
+                return i
+        return None
 
     def updateWayPoints(self):
         actor = self.target
@@ -1014,6 +1245,8 @@ class PathCamera(bat.bats.BX_GameObject, bge.types.KX_GameObject):
             self.pathHead.owner.worldPosition = actor.worldPosition
             bat.bmath.reset_orientation(self.pathHead.owner)
 
+        pruned = self.path.prune()
+
         # Add a new node if the actor has moved far enough.
         addNew = False
         if len(self.path) == 0:
@@ -1024,48 +1257,61 @@ class PathCamera(bat.bats.BX_GameObject, bge.types.KX_GameObject):
             if vec.magnitude > self.MIN_DIST:
                 addNew = True
 
+        trimmed = False
         if addNew:
-            node = PathCamera.CameraNode()
+            # Reuses the oldest node if the path is full.
+            trimmed = self.path.is_full()
+            node = self.path.push()
 
             if actor.localCoordinates:
                 bat.bmath.copy_transform(actor, node.owner)
             else:
-                node.owner.worldPosition = actor.worldPosition
+                bat.bmath.reset_orientation(node.owner)
             node.owner.worldPosition = actor.worldPosition
-            self.path.insert(0, node)
             if actor.touchedObject is not None:
                 node.owner.setParent(actor.touchedObject, False)
-            if len(self.path) > self.MAX_NODES:
-                # Delete the oldest node.
-                self.path.pop().destroy()
 
         # Update the ceiling height for each node, ensuring a smooth transition
-        # between consecutive z-offsets.
-        self.pathHead.update()
-        for node in self.path:
-            node.update()
-
-        def pingPong(iterable):
-            # pingPong('ABC') --> A B C C B A
-            for element in iterable:
-                yield element
-            for element in reversed(iterable):
-                yield element
-
-        def marginMin(current, nxt, margin):
-            return min(current + margin, nxt)
-
-        currentOffset = self.pathHead.ceilingHeight
-        for node in pingPong(self.path):
-            node.setCeilingHeight(marginMin(currentOffset, node.ceilingHeight,
-                                self.ZOFFSET_INCREMENT))
-            currentOffset = node.ceilingHeight
-        self.pathHead.setCeilingHeight(marginMin(currentOffset,
-                                        self.pathHead.ceilingHeight,
-                                        self.ZOFFSET_INCREMENT))
+        # between consecutive z-offsets. Only nodes that have been measured
+        # again (and their neighbours) need to be smoothed.
+        nodes = [self.pathHead]
+        nodes.extend(self.path)
+        dirty = [i for i, node in enumerate(nodes) if node.update(i == 0)]
+        if trimmed:
+            dirty.append(len(nodes) - 1)
+        if pruned:
+            # Some nodes died with the objects they were attached to; their
+            # positions in the path are unknown.
+            dirty.append(0)
+            dirty.append(len(nodes) - 1)
+
+        if len(dirty) > 0:
+            self.smoothCeiling(nodes, min(dirty), max(dirty))
+
+    def smoothCeiling(self, nodes, first, last):
+        '''Limit the difference in ceiling height between consecutive nodes to
+        ZOFFSET_INCREMENT. Only the heights of nodes that could be affected by
+        nodes first..last are changed.'''
+
+        radius = self.ZOFFSET_RADIUS
+        lo = max(first - radius, 0)
+        hi = min(last + radius, len(nodes) - 1)
+        # Nodes outside the affected span still influence it, so include them
+        # in the calculation.
+        wlo = max(lo - radius, 0)
+        whi = min(hi + radius, len(nodes) - 1)
+
+        heights = [node.rawCeilingHeight for node in nodes[wlo:whi + 1]]
+        for i in range(1, len(heights)):
+            heights[i] = min(heights[i - 1] + self.ZOFFSET_INCREMENT, heights[i])
+        for i in range(len(heights) - 2, -1, -1):
+            heights[i] = min(heights[i + 1] + self.ZOFFSET_INCREMENT, heights[i])
+
+        for i in range(lo, hi + 1):
+            nodes[i].setCeilingHeight(heights[i - wlo])
+
     def endObject(self):
-        for node in self.path:
-            node.destroy()
+        self.path.destroy()
         if PathCamera.log.isEnabledFor(10):
             self.targetVis.endObject()
             self.predictVis.endObject()
@@ -1079,17 +1325,71 @@ class PathCamera(bat.bats.BX_GameObject, bge.types.KX_GameObject):
 class CameraCollider(bat.bats.BX_GameObject, bge.types.KX_GameObject):
     '''Senses when the camera is inside something. This senses when the
     camera touches a volumetric object, and then tracks to see when the camera
-    enters and leaves that object, adjusting the screen filter appropriately.'''
+    enters and leaves that object, adjusting the screen filter appropriately.
+
+    Rays are only cast when the camera is within the bounding box of a volume.
+    The volumes are objects with a VolumeCol property. They are found when the
+    collider is created, and again when a level finishes loading. Volumes are
+    assumed to be static; those that move must have a VolumeMoves property, and
+    their bounds are updated every tic. The test is repeated when the camera
+    moves, and when a volume moves or is added.'''
+
+    log = logging.getLogger(__name__ + '.CameraCollider')
 
     MAX_DIST = 1000.0
 
     def __init__(self, old_owner):
+        # Map of volume objects to their world-space bounds: (low, high).
+        self.volumes = {}
+        # Volumes that have a VolumeMoves property: map of object to the
+        # transform that its bounds were measured at.
+        self.moving = {}
+        self.moveTask = None
+        self.cameraPos = None
         AutoCamera().add_observer(self)
+        bat.event.EventBus().add_listener(self)
         self.set_filter_colour(None)
+        self.find_volumes(self.scene)
+
+    def on_event(self, evt):
+        if evt.message == 'FinishLoading':
+            if self.find_volumes(self.scene) > 0 and self.cameraPos is not None:
+                self.test_membership()
 
     def on_camera_moved(self, ac):
         self.worldPosition = ac.camera.worldPosition
-        pos = ac.camera.worldPosition.copy()
+        self.cameraPos = ac.camera.worldPosition.copy()
+        self.test_membership()
+
+    def update_moving(self):
+        '''Keep the bounds of moving volumes up to date. Runs once per tic
+        while there are any.'''
+        self.moveTask = None
+        changed = False
+        for ob in list(self.moving.keys()):
+            if ob.invalid:
+                del self.moving[ob]
+                self.volumes.pop(ob, None)
+                continue
+            if self.moving[ob] != ob.worldTransform:
+                self.moving[ob] = ob.worldTransform.copy()
+                self.volumes[ob] = self.get_bounds(ob)
+                changed = True
+
+        if changed and self.cameraPos is not None:
+            # The camera may be inside (or outside) a volume now, even though
+            # it hasn't moved.
+            self.test_membership()
+
+        if len(self.moving) > 0:
+            self.moveTask = Scripts.scheduler.Scheduler().call_later(1,
+                    self.update_moving, owner=self)
+
+    def test_membership(self):
+        pos = self.cameraPos
+        if not self.in_volume_bounds(pos):
+            self.set_filter_colour(None)
+            return
 
         direction = bat.bmath.ZAXIS.copy()
         ob = self.cast_for_water(pos, direction)
@@ -1105,6 +1405,58 @@ class CameraCollider(bat.bats.BX_GameObject, bge.types.KX_GameObject):
         else:
             self.set_filter_colour(None)
 
+    def in_volume_bounds(self, pos):
+        '''Test whether a point is inside the bounding box of any volume. If
+        not, it can't be inside a volume.'''
+        for ob, (low, high) in self.volumes.items():
+            if ob.invalid:
+                continue
+            if (low.x <= pos.x <= high.x and low.y <= pos.y <= high.y and
+                    low.z <= pos.z <= high.z):
+                return True
+        return False
+
+    def find_volumes(self, sce):
+        '''Look for volumes that aren't known yet, and forget the ones that
+        have been destroyed.
+        @return: the number of new volumes.'''
+        for ob in list(self.volumes.keys()):
+            if ob.invalid:
+                del self.volumes[ob]
+                self.moving.pop(ob, None)
+
+        nFound = 0
+        for ob in sce.objects:
+            if 'VolumeCol' not in ob or ob in self.volumes:
+                continue
+            self.volumes[ob] = self.get_bounds(ob)
+            if 'VolumeMoves' in ob:
+                self.moving[ob] = ob.worldTransform.copy()
+            nFound += 1
+        if nFound > 0:
+            CameraCollider.log.info("Found %d new volumes (%d total, %d "
+                    "moving)", nFound, len(self.volumes), len(self.moving))
+
+        if len(self.moving) > 0 and (self.moveTask is None or
+                not self.moveTask.pending):
+            self.moveTask = Scripts.scheduler.Scheduler().call_later(1,
+                    self.update_moving, owner=self)
+        return nFound
+
+    @staticmethod
+    def get_bounds(ob):
+        transform = ob.worldTransform
+        low = ob.worldPosition.copy()
+        high = ob.worldPosition.copy()
+        for me in ob.meshes:
+            for mi in range(len(me.materials)):
+                for vi in range(me.getVertexArrayLength(mi)):
+                    pos = transform * me.getVertex(mi, vi).getXYZ()
+                    for axis in range(3):
+                        low[axis] = min(low[axis], pos[axis])
+                        high[axis] = max(high[axis], pos[axis])
+        return low, high
+
     def set_filter_colour(self, colour):
         try:
             if colour == self.last_colour:
@@ -1116,7 +1468,7 @@ class CameraCollider(bat.bats.BX_GameObject, bge.types.KX_GameObject):
 
     def cast_for_water(self, pos, direction):
         through = pos + direction * CameraCollider.MAX_DIST
-        ob, _, normal = self.rayCast(through, pos, 0.0, 'VolumeCol', 1, 1, 0)
+        ob, _, normal = ray_cast(self, through, pos, 0.0, 'VolumeCol', 1, 1, 0)
         if ob is not None and normal.dot(direction) > 0.0:
             return ob
         else:
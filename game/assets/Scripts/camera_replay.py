@@ -0,0 +1,384 @@
+#
+# Copyright 2009-2012 Alex Fraser <alex@phatcore.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+'''
+Records the inputs to the cameras during play, so that they can be replayed
+later without running the game.
+
+A recording contains one JSON object per line, one line per frame. Each frame
+holds the transform of the main character, the goals on the AutoCamera's
+queue, the rays that the cameras cast (and what they hit), and the resulting
+camera transform.
+
+To record, set the CARGO_CAMERA_RECORDING environment variable to the path of
+the file to write before starting the game. To replay, see
+BScripts/replay_camera.py.
+'''
+
+import atexit
+import json
+import logging
+import time
+
+import bge
+import mathutils
+
+import bat.bats
+import bat.utils
+
+import Scripts.camera
+import Scripts.director
+
+clock = getattr(time, 'perf_counter', time.time)
+
+def point_of(ob_or_vec):
+    '''Get the position of a ray end point, which may be an object or a
+    vector.'''
+    if hasattr(ob_or_vec, 'worldPosition'):
+        return ob_or_vec.worldPosition.copy()
+    return mathutils.Vector(ob_or_vec)
+
+def _vec(v):
+    if v is None:
+        return None
+    return list(v)
+
+def _mat(m):
+    return [list(row) for row in m]
+
+def _transform(ob):
+    return {'pos': _vec(ob.worldPosition), 'orn': _mat(ob.worldOrientation)}
+
+def _goal_id(goal):
+    return '%s#%x' % (goal.name, id(goal))
+
+class Recorder(metaclass=bat.bats.Singleton):
+    '''Writes the inputs and outputs of the cameras to a file, once per frame.
+    Call start to begin recording. The file is flushed after every frame, so
+    a recording survives a crash; it is closed when the game exits.
+
+    Goals may update after the AutoCamera in the same tic, so a frame isn't
+    written until the camera's scene is about to be drawn. That way the rays
+    that those goals cast are kept with the frame they were cast in.'''
+
+    log = logging.getLogger(__name__ + '.Recorder')
+
+    # Goal properties that affect the behaviour of the AutoCamera.
+    GOAL_PROPS = ('LocFac', 'RotFac', 'InstantCut', 'Priority', 'CameraType')
+
+    def __init__(self):
+        self.file = None
+        self.nFrames = 0
+        self.frame = None
+        self.rays = []
+        self.pushed = []
+        self.scene = None
+        self._ray_cast = None
+
+    def start(self, path):
+        Recorder.log.info('Recording camera to %s', path)
+        self.file = open(path, 'w')
+        self._ray_cast = Scripts.camera.ray_cast
+        Scripts.camera.ray_cast = self.record_ray
+        Scripts.camera.AutoCamera().recorder = self
+        atexit.register(self.stop)
+
+    def stop(self):
+        if self.file is None:
+            return
+        self.flush_frame()
+        self.set_scene(None)
+        Recorder.log.info('Recorded %d frames', self.nFrames)
+        Scripts.camera.ray_cast = self._ray_cast
+        Scripts.camera.AutoCamera().recorder = None
+        self.file.close()
+        self.file = None
+
+    def record_ray(self, ob, objto, objfrom=None, dist=0.0, prop='', *args):
+        result = self._ray_cast(ob, objto, objfrom, dist, prop, *args)
+        if objfrom is None:
+            objfrom = ob
+        hitOb, hitPoint, hitNorm = result[:3]
+        self.rays.append({
+            'from': _vec(point_of(objfrom)),
+            'to': _vec(point_of(objto)),
+            'dist': dist,
+            'prop': prop,
+            'hit': hitOb.name if hitOb is not None else None,
+            'point': _vec(hitPoint),
+            'normal': _vec(hitNorm)})
+        return result
+
+    def record_goal(self, goal):
+        info = _transform(goal)
+        info['id'] = _goal_id(goal)
+        info['name'] = goal.name
+        info['type'] = goal.__class__.__name__
+        info['lens'] = getattr(goal, 'lens', None)
+        info['props'] = dict((p, goal[p]) for p in Recorder.GOAL_PROPS)
+        self.pushed.append(info)
+
+    def record_frame(self, ac):
+        if self.file is None or ac.camera is None:
+            return
+
+        # Normally the frame has already been written by the draw callback,
+        # but the engine may run several tics per drawn frame.
+        self.flush_frame()
+        self.set_scene(bat.utils.get_scene(ac.camera))
+
+        frame = {'frame': self.nFrames}
+        actor = Scripts.director.Director().mainCharacter
+        if actor is not None:
+            frame['actor'] = _transform(actor)
+            frame['actor']['local'] = actor.localCoordinates
+            touched = actor.touchedObject
+            frame['actor']['touched'] = touched.name if touched is not None else None
+            frame['track'] = _transform(actor.get_camera_tracking_point())
+        frame['goals'] = [_goal_id(g) for g in ac.queue]
+        frame['camera'] = _transform(ac.camera)
+        frame['camera']['lens'] = ac.camera.lens
+        self.frame = frame
+
+    def flush_frame(self):
+        '''Write the current frame, along with the rays and goals that have
+        been recorded since the previous one.'''
+        if self.file is None or self.frame is None:
+            return
+        frame = self.frame
+        frame['pushed'] = self.pushed
+        frame['rays'] = self.rays
+
+        self.file.write(json.dumps(frame))
+        self.file.write('\n')
+        self.file.flush()
+        self.nFrames += 1
+        self.frame = None
+        self.rays = []
+        self.pushed = []
+
+    def set_scene(self, scene):
+        '''Move the draw callback to the scene that the camera is in.'''
+        if scene is self.scene:
+            return
+        if self.scene is not None and not self.scene.invalid:
+            self.scene.pre_draw.remove(self.flush_frame)
+        self.scene = scene
+        if scene is not None:
+            scene.pre_draw.append(self.flush_frame)
+
+class RayOracle:
+    '''Answers rays using the results of a recording. Each ray is matched with
+    the closest recorded ray of the same frame; rays that don't match any
+    recorded ray (within TOLERANCE) are counted, and treated as misses.'''
+
+    TOLERANCE = 0.5
+
+    def __init__(self, scene):
+        self.scene = scene
+        self.rays = []
+        self.hitObjects = {}
+        self.nCast = 0
+        self.nUnmatched = 0
+
+    def set_frame(self, rays):
+        self.rays = rays
+        for ray in rays:
+            ray['from'] = mathutils.Vector(ray['from'])
+            ray['to'] = mathutils.Vector(ray['to'])
+
+    def __call__(self, ob, objto, objfrom=None, dist=0.0, prop='', *args):
+        self.nCast += 1
+        if objfrom is None:
+            objfrom = ob
+        origin = point_of(objfrom)
+        through = point_of(objto)
+
+        best = None
+        bestError = RayOracle.TOLERANCE
+        for ray in self.rays:
+            if ray['prop'] != prop or ray['dist'] != dist:
+                continue
+            error = (ray['from'] - origin).magnitude + (ray['to'] - through).magnitude
+            if error <= bestError:
+                best = ray
+                bestError = error
+
+        if best is None:
+            self.nUnmatched += 1
+            return None, None, None
+        if best['hit'] is None:
+            return None, None, None
+        return (self.get_hit_object(best['hit']),
+                mathutils.Vector(best['point']),
+                mathutils.Vector(best['normal']))
+
+    def get_hit_object(self, name):
+        try:
+            return self.hitObjects[name]
+        except KeyError:
+            ob = self.scene.addObject(name)
+            self.hitObjects[name] = ob
+            return ob
+
+class Replayer:
+    '''Runs the cameras against a recording. The game engine must already be
+    available (or stubbed out; see BScripts/replay_camera.py), and no game
+    objects should exist other than the ones created here.'''
+
+    log = logging.getLogger(__name__ + '.Replayer')
+
+    # Goal types that compute their own transform, and so must be run rather
+    # than just positioned.
+    REPLAYABLE = {
+        'PathCamera': Scripts.camera.PathCamera,
+        'OrbitCamera': Scripts.camera.OrbitCamera,
+        }
+
+    def __init__(self, frames):
+        self.frames = frames
+        self.scene = bge.logic.getCurrentScene()
+        self.oracle = RayOracle(self.scene)
+        self.known = {}
+        self.goals = {}
+
+        self.actor = self.scene.addObject('ReplayActor')
+        self.actor.touchedObject = None
+        self.track = self.scene.addObject('ReplayTrackingPoint')
+        self.actor.get_camera_tracking_point = lambda: self.track
+        Scripts.director.Director().mainCharacter = self.actor
+
+        self.camera = self.scene.addObject('ReplayCamera')
+        self.camera['focalDepth'] = 0.0
+        self.camera['baseBlurRadius'] = 0.0
+        self.ac = Scripts.camera.AutoCamera()
+        self.ac.camera = self.camera
+
+        # Results, per frame.
+        self.costs = []
+        self.divergences = []
+        self.nRaysRecorded = 0
+
+    def run(self):
+        Scripts.camera.ray_cast = self.oracle
+        for i, frame in enumerate(self.frames):
+            if i == 0:
+                self._set_transform(self.camera, frame['camera'])
+                self.camera.lens = frame['camera']['lens']
+                self.ac.defaultLens = self.camera.lens
+            self.play_frame(frame)
+
+    def play_frame(self, frame):
+        if 'actor' in frame:
+            self._set_transform(self.actor, frame['actor'])
+            self._set_transform(self.track, frame['track'])
+            self.actor.localCoordinates = frame['actor']['local']
+            touched = frame['actor']['touched']
+            if touched is not None:
+                touched = self.oracle.get_hit_object(touched)
+            self.actor.touchedObject = touched
+        self._sync_goals(frame)
+        self.oracle.set_frame(frame['rays'])
+        self.nRaysRecorded += len(frame['rays'])
+
+        start = clock()
+        for goal in self.goals.values():
+            if goal.__class__.__name__ in Replayer.REPLAYABLE:
+                goal.update()
+        self.ac.update()
+        self.costs.append(clock() - start)
+
+        pos = mathutils.Vector(frame['camera']['pos'])
+        self.divergences.append((self.camera.worldPosition - pos).magnitude)
+
+    def _sync_goals(self, frame):
+        for info in frame['pushed']:
+            self.known[info['id']] = info
+
+        wanted = frame['goals']
+        for gid in list(self.goals.keys()):
+            if gid in wanted:
+                continue
+            goal = self.goals.pop(gid)
+            self.ac.remove_goal(goal)
+            goal.endObject()
+
+        # The queue is listed top-first. Goals with equal priority are stacked
+        # in the order they are added, so add them from the bottom.
+        for gid in reversed(wanted):
+            if gid in self.goals:
+                continue
+            try:
+                info = self.known[gid]
+            except KeyError:
+                Replayer.log.warn('Goal %s was added before recording began', gid)
+                continue
+            self.goals[gid] = self._create_goal(info)
+
+    def _create_goal(self, info):
+        ob = self.scene.addObject(info['name'])
+        self._set_transform(ob, info)
+        if info['lens'] is not None:
+            ob.lens = info['lens']
+        for name, value in info['props'].items():
+            ob[name] = value
+
+        try:
+            cls = Replayer.REPLAYABLE[info['type']]
+        except KeyError:
+            self.ac.add_goal(ob)
+            return ob
+
+        # These add themselves to the AutoCamera.
+        goal = cls(ob)
+        if isinstance(goal, Scripts.camera.PathCamera):
+            goal.target = self.actor
+        elif isinstance(goal, Scripts.camera.OrbitCamera):
+            goal.alignment = Scripts.camera.OrbitCameraAlignment()
+        return goal
+
+    @staticmethod
+    def _set_transform(ob, info):
+        ob.worldPosition = info['pos']
+        ob.worldOrientation = mathutils.Matrix(info['orn'])
+
+    def report(self):
+        '''Summarise the cost of each frame, and how far the replay strayed from
+        the recording.'''
+        n = len(self.costs)
+        if n == 0:
+            return 'No frames replayed.'
+
+        costs = sorted(c * 1000.0 for c in self.costs)
+        worst = max(range(n), key=lambda i: self.divergences[i])
+        lines = [
+            'Frames: %d' % n,
+            'Frame cost (ms): mean %.3f, median %.3f, 95th %.3f, max %.3f' % (
+                sum(costs) / n, costs[n // 2], costs[int(n * 0.95)],
+                costs[-1]),
+            'Rays per frame: replayed %.1f, recorded %.1f, unmatched %.1f' % (
+                self.oracle.nCast / n, self.nRaysRecorded / n,
+                self.oracle.nUnmatched / n),
+            'Camera divergence: mean %.3f, max %.3f (frame %d)' % (
+                sum(self.divergences) / n, self.divergences[worst],
+                self.frames[worst]['frame']),
+            ]
+        return '\n'.join(lines)
+
+def load_recording(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
@@ -23,6 +23,8 @@ import bat.bmath
 import bat.sound
 import bat.utils
 
+import Scripts.scheduler
+
 
 _CREDIT_ITEMS = [
     'epilogue_saucebar',
@@ -105,8 +107,11 @@ class CreditsController(bat.impulse.Handler, bat.bats.BX_GameObject,
 
     _prefix = ""
 
+    # Time to wait after the last plate has gone, in tics.
+    END_DELAY = 60
+
     def __init__(self, old_owner):
-        self.countdown = 60
+        self.end_task = None
         self.current_plates = bat.containers.SafeList()
         self.plates = plate_generator(_CREDIT_ITEMS)
         bat.sound.Jukebox().play_files('credits', self, 1,
@@ -116,6 +121,8 @@ class CreditsController(bat.impulse.Handler, bat.bats.BX_GameObject,
 
     @bat.bats.expose
     def update(self):
+        Scripts.scheduler.Scheduler().update()
+
         for plate in self.current_plates:
             plate.update()
 
@@ -125,10 +132,12 @@ class CreditsController(bat.impulse.Handler, bat.bats.BX_GameObject,
             if self.current_plates[-1].can_spawn_next():
                 self.spawn_next_plate()
 
-        if len(self.current_plates) <= 0:
-            self.countdown -= 1
-            if self.countdown <= 0:
-                bge.logic.startGame('//Menu.blend')
+        if len(self.current_plates) <= 0 and self.end_task is None:
+            self.end_task = Scripts.scheduler.Scheduler().call_later(
+                    CreditsController.END_DELAY, self.finish, owner=self)
+
+    def finish(self):
+        bge.logic.startGame('//Menu.blend')
 
     def spawn_next_plate(self):
         sce = bge.logic.getCurrentScene()
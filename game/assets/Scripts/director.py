@@ -26,6 +26,8 @@ import bat.event
 import bat.utils
 import bat.impulse
 
+import Scripts.scheduler
+
 DEBUG = False
 
 class Actor(bat.bats.BX_GameObject):
@@ -331,6 +333,8 @@ class Director(bat.impulse.Handler, metaclass=bat.bats.Singleton):
 
     @bat.bats.expose
     def update(self):
+        Scripts.scheduler.Scheduler().update()
+
         # Make sure all actors are within the world.
         for actor in self.actors:
             if not actor.is_inside_world():
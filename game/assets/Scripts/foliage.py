@@ -15,11 +15,16 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 #
 
-import time
+import math
 
 import bge
 import mathutils
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 import bat.bats
 import bat.event
 import bat.utils
@@ -27,10 +32,106 @@ import bat.bmath
 import bat.render
 import bat.sound
 
+import Scripts.scheduler
+
 DEBUG = False
 
 ZERO2 = mathutils.Vector((0.0, 0.0))
 
+def has_collision_sensor(ob):
+    '''Test whether an object has its own Near or Collision sensor. Objects
+    that don't can be managed by FoliageCollider instead.'''
+    for s in ob.sensors:
+        if isinstance(s, (bge.types.KX_NearSensor, bge.types.KX_TouchSensor)):
+            return True
+    return False
+
+class FoliageCollider(metaclass=bat.bats.Singleton):
+    '''Finds actors that are touching foliage, for foliage that doesn't have
+    its own sensors. Foliage is static, so it is stored in a grid; once per
+    frame, each actor looks for foliage in the cells that it overlaps.
+
+    Foliage objects must provide:
+     - get_collision_reach(): the distance at which an actor can affect the
+       object (not counting the actor's LODRadius).
+     - set_colliders(colliders): called with the actors that are in range, and
+       once more with an empty list when they all leave.
+
+    The grid belongs to one scene; it is emptied when foliage from another
+    scene is added, or when its scene ends.'''
+
+    CELL_SIZE = 5.0
+
+    def __init__(self):
+        self.reset(None)
+
+    def reset(self, scene):
+        self.scene = scene
+        self.cells = {}
+        self.maxReach = 0.0
+        self.touched = set()
+
+    def _cell(self, pos):
+        return (int(math.floor(pos.x / FoliageCollider.CELL_SIZE)),
+                int(math.floor(pos.y / FoliageCollider.CELL_SIZE)),
+                int(math.floor(pos.z / FoliageCollider.CELL_SIZE)))
+
+    def add(self, ob):
+        if self.scene is not ob.scene:
+            self.reset(ob.scene)
+        reach = ob.get_collision_reach()
+        self.maxReach = max(self.maxReach, reach)
+        entry = (ob, ob.worldPosition.copy(), reach)
+        self.cells.setdefault(self._cell(ob.worldPosition), []).append(entry)
+
+    def update(self, actors):
+        '''Push intrusions to foliage near the actors. Call this once per
+        frame.'''
+        if self.scene is not None and self.scene.invalid:
+            self.reset(None)
+        if len(self.cells) == 0:
+            return
+
+        hits = {}
+        for actor in actors:
+            pos = actor.worldPosition
+            radius = actor.get('LODRadius', 1.0)
+            extent = radius + self.maxReach
+            low = self._cell(pos - mathutils.Vector((extent, extent, extent)))
+            high = self._cell(pos + mathutils.Vector((extent, extent, extent)))
+            for x in range(low[0], high[0] + 1):
+                for y in range(low[1], high[1] + 1):
+                    for z in range(low[2], high[2] + 1):
+                        self._collide_cell((x, y, z), actor, pos, radius, hits)
+
+        for ob in self.touched.difference(hits):
+            if not ob.invalid:
+                ob.set_colliders([])
+        for ob, colliders in hits.items():
+            ob.set_colliders(colliders)
+        self.touched = set(hits)
+
+    def _collide_cell(self, key, actor, pos, radius, hits):
+        try:
+            entries = self.cells[key]
+        except KeyError:
+            return
+
+        dead = False
+        for ob, obPos, reach in entries:
+            if ob.invalid:
+                dead = True
+                continue
+            if (obPos - pos).magnitude <= reach + radius:
+                hits.setdefault(ob, []).append(actor)
+
+        if dead:
+            entries = [e for e in entries if not e[0].invalid]
+            if len(entries) == 0:
+                del self.cells[key]
+            else:
+                self.cells[key] = entries
+
 class Clover(bat.bats.BX_GameObject, bge.types.KX_GameObject):
     '''A health powerup.'''
 
@@ -43,7 +144,7 @@ class Clover(bat.bats.BX_GameObject, bge.types.KX_GameObject):
     RESPAWN_TIME = 5 * 60
 
     def __init__(self, old_owner):
-        self.hit_time = time.time()
+        self.respawn_task = None
         self.set_state(Clover.S_IDLE)
 
     @bat.bats.expose
@@ -56,17 +157,23 @@ class Clover(bat.bats.BX_GameObject, bge.types.KX_GameObject):
             self.scene.addObject("Clover_dynamic", head)
             head.visible = False
             self.playAction('CL_stem_action.001', 1, 40)
-            self.hit_time = time.time()
             self.set_state(Clover.S_RESPAWNING)
+            self.respawn_task = Scripts.scheduler.Scheduler().call_after_seconds(
+                    Clover.RESPAWN_TIME, self.respawn, owner=self)
 
     @bat.bats.expose
     def respawn_pulse(self):
-        ctime = time.time()
-        if ctime - self.hit_time > Clover.RESPAWN_TIME:
-            head = self.children['CL_Head']
-            head.visible = True
-            self.playAction('CL_stem_action.001', 1, 1)
-            self.set_state(Clover.S_IDLE)
+        # Called by a slow Always sensor in Destroyables.blend while
+        # respawning. Respawning is scheduled now, so there's nothing to do;
+        # this can go when that brick is removed.
+        pass
+
+    def respawn(self):
+        self.respawn_task = None
+        head = self.children['CL_Head']
+        head.visible = True
+        self.playAction('CL_stem_action.001', 1, 1)
+        self.set_state(Clover.S_IDLE)
 
 class SBParticle:
     '''A 2D softbody particle. Always tries to return to (0, 0). Set the Frame
@@ -96,6 +203,9 @@ class FlexibleObject(bat.bats.BX_GameObject, bge.types.BL_ArmatureObject):
     S_INIT = 1
     S_UPDATE = 2
 
+    # Used by FoliageCollider, unless the object has a CollisionReach property.
+    DEFAULT_REACH = 2.0
+
     def __init__(self, old_owner):
         self.Segments = []
         for i in range(0, self['nSegments']):
@@ -110,25 +220,50 @@ class FlexibleObject(bat.bats.BX_GameObject, bge.types.BL_ArmatureObject):
             for child in self.children:
                 child.color = bat.render.BLACK
 
+        if not has_collision_sensor(self):
+            FoliageCollider().add(self)
+
     @bat.bats.expose
     @bat.utils.controller_cls
     def collide(self, c):
+        s = c.sensors['Near']
+        self.set_colliders(s.hitObjectList)
+
+    def get_collision_reach(self):
+        return self.get('CollisionReach', FlexibleObject.DEFAULT_REACH)
+
+    def set_colliders(self, colliders):
         #
         # Find the offset of the base.
         #
-        s = c.sensors['Near']
-        vec = ZERO2.copy()
-        for col in s.hitObjectList:
-            vec = vec + self.get_collision_force(col)
+        vec = self.get_collision_forces(colliders)
         self['BladeXBase'] = vec.x
         self['BladeYBase'] = vec.y
         self.intrusion = vec
         if vec.magnitude > 0.0:
             self.add_state(FlexibleObject.S_UPDATE)
 
+    def get_collision_forces(self, colliders):
+        '''Get the sum of the forces exerted by a number of colliders.'''
+        vec = ZERO2.copy()
+        for col in colliders:
+            vec = vec + self.get_collision_force(col)
+        return vec
+
     @bat.bats.expose
     @bat.utils.controller_cls
     def update(self, c):
+        if numpy is not None:
+            GrassSimulator().update(self)
+        else:
+            self.update_dynamics()
+
+        for act in c.actuators:
+            c.activate(act)
+
+    def update_dynamics(self):
+        '''Integrate the segments of this object. GrassSimulator does the
+        same thing for many objects at once.'''
         linkDisplacement = self.intrusion - self.LastBaseFrame
         self.LastBaseFrame = self.intrusion.copy()
 
@@ -136,13 +271,8 @@ class FlexibleObject(bat.bats.BX_GameObject, bge.types.BL_ArmatureObject):
         # Provide input to other logic paths (a sensor might watch this).
         #
         if self.jolt_frames == 0 and linkDisplacement.magnitude > 15.0:
-            self['Jolted'] = True
             self.jolt_frames = 100
-            if 'JoltMessage' in self:
-                evt = bat.event.Event(self['JoltMessage'])
-                if 'JoltBody' in self:
-                    evt.body = self['JoltBody']
-                evt.send()
+            self.on_jolt()
         elif self.jolt_frames > 0:
             self['Jolted'] = False
             self.jolt_frames -= 1
@@ -163,55 +293,257 @@ class FlexibleObject(bat.bats.BX_GameObject, bge.types.BL_ArmatureObject):
         if max_offset < 0.1:
             self.rem_state(FlexibleObject.S_UPDATE)
 
-        for act in c.actuators:
-            c.activate(act)
-
-class GrassBlade(FlexibleObject):
-
-    @bat.bats.profile('Scripts.foliage.GrassBlade.__init__')
-    def __init__(self, old_owner):
-        FlexibleObject.__init__(self, old_owner)
-        self.bbox = bat.bmath.Box2D(
-                0.0 - self['GrassRadY'], 0.0 - self['GrassRadZ'],
-                self['GrassRadY'], self['GrassRadZ'])
+    def on_jolt(self):
+        self['Jolted'] = True
+        if 'JoltMessage' in self:
+            evt = bat.event.Event(self['JoltMessage'])
+            if 'JoltBody' in self:
+                evt.body = self['JoltBody']
+            evt.send()
+
+class GrassSimulator(metaclass=bat.bats.Singleton):
+    '''Integrates the segments of all awake FlexibleObjects in one step, using
+    NumPy. Each object calls update while it is awake, which adds it to the
+    simulation. The simulation is stepped once per logic tic by a scheduled
+    task, and only properties that have changed are written back to the
+    objects.
+
+    The results are the same as FlexibleObject.update_dynamics, except that an
+    object that wakes up after this tic's step joins on the next tic.'''
+
+    # Properties are only written when they change by more than this.
+    PROP_EPSILON = 0.0001
+    # Objects are put to sleep when all segments are slower and closer to
+    # rest than this.
+    SLEEP_THRESHOLD = 0.1
+    JOLT_THRESHOLD = 15.0
+    JOLT_FRAMES = 100
+
+    def __init__(self):
+        self.blades = []
+        self.index = {}
+        self.task = None
+        self.taskScene = None
+        # Blades that went to sleep in the last step.
+        self.slept = set()
+        self.props = []
+
+        self.frame = numpy.zeros((0, 0, 2))
+        self.velocity = numpy.zeros((0, 0, 2))
+        self.written = numpy.zeros((0, 0, 2))
+        self.mask = numpy.zeros((0, 0), dtype=bool)
+        self.spring = numpy.zeros((0, 1))
+        self.damping = numpy.zeros((0, 1))
+        self.lastBase = numpy.zeros((0, 2))
+        self.jolt = numpy.zeros(0, dtype=int)
+
+    def update(self, blade):
+        '''Add a blade to the simulation, if it isn't there already. It will
+        be stepped from the next step onwards.'''
+        if blade in self.index or blade in self.slept:
+            return
+        self.add(blade)
+        if (self.task is None or not self.task.pending or
+                self.taskScene.invalid):
+            self.schedule(blade.scene)
+
+    def schedule(self, scene):
+        self.taskScene = scene
+        self.task = Scripts.scheduler.Scheduler().call_later(1,
+                self.on_tic, scene=scene)
+
+    def on_tic(self):
+        self.step()
+        if len(self.blades) > 0:
+            self.schedule(self.taskScene)
+        else:
+            # No more steps until a blade wakes up, so nothing else will
+            # clear this.
+            self.slept.clear()
+            self.task = None
+
+    def add(self, blade):
+        nSegments = len(blade.Segments)
+        if nSegments > self.frame.shape[1]:
+            self._resize(nSegments)
+        width = self.frame.shape[1]
+
+        frame = numpy.zeros((1, width, 2))
+        velocity = numpy.zeros((1, width, 2))
+        mask = numpy.zeros((1, width), dtype=bool)
+        for i, s in enumerate(blade.Segments):
+            frame[0, i] = s.Frame.x, s.Frame.y
+            velocity[0, i] = s.Velocity.x, s.Velocity.y
+            mask[0, i] = True
+
+        self.frame = numpy.concatenate((self.frame, frame))
+        self.velocity = numpy.concatenate((self.velocity, velocity))
+        self.written = numpy.concatenate((self.written, frame))
+        self.mask = numpy.concatenate((self.mask, mask))
+        self.spring = numpy.concatenate((self.spring, [[blade['Spring']]]))
+        self.damping = numpy.concatenate((self.damping, [[blade['Damping']]]))
+        base = blade.LastBaseFrame
+        self.lastBase = numpy.concatenate((self.lastBase, [[base.x, base.y]]))
+        self.jolt = numpy.concatenate((self.jolt, [blade.jolt_frames]))
+
+        self.index[blade] = len(self.blades)
+        self.blades.append(blade)
+
+    def _resize(self, width):
+        pad = width - self.frame.shape[1]
+        padding = ((0, 0), (0, pad), (0, 0))
+        self.frame = numpy.pad(self.frame, padding, 'constant')
+        self.velocity = numpy.pad(self.velocity, padding, 'constant')
+        self.written = numpy.pad(self.written, padding, 'constant')
+        self.mask = numpy.pad(self.mask, ((0, 0), (0, pad)), 'constant')
+        for i in range(len(self.props), width):
+            self.props.append(("BladeX%d" % i, "BladeY%d" % i))
+
+    def remove(self, keep):
+        '''Remove objects from the simulation, storing their state back in
+        their segments.
+        @param keep: A boolean array; objects that are False are removed.'''
+        for i in numpy.nonzero(~keep)[0]:
+            blade = self.blades[i]
+            if blade.invalid:
+                continue
+            for j, s in enumerate(blade.Segments):
+                s.Frame = mathutils.Vector(self.frame[i, j])
+                s.Velocity = mathutils.Vector(self.velocity[i, j])
+            blade.LastBaseFrame = mathutils.Vector(self.lastBase[i])
+            blade.jolt_frames = int(self.jolt[i])
+
+        self.blades = [b for b, k in zip(self.blades, keep) if k]
+        self.index = dict((b, i) for i, b in enumerate(self.blades))
+        self.frame = self.frame[keep]
+        self.velocity = self.velocity[keep]
+        self.written = self.written[keep]
+        self.mask = self.mask[keep]
+        self.spring = self.spring[keep]
+        self.damping = self.damping[keep]
+        self.lastBase = self.lastBase[keep]
+        self.jolt = self.jolt[keep]
+
+    def step(self):
+        self.slept.clear()
+        alive = numpy.array([not b.invalid for b in self.blades], dtype=bool)
+        if not alive.all():
+            self.remove(alive)
+        blades = self.blades
+        if len(blades) == 0:
+            return
+
+        intrusion = numpy.array([(b.intrusion.x, b.intrusion.y) for b in blades])
+        link = intrusion - self.lastBase
+        self.lastBase = intrusion
 
-    def get_collision_force(self, collider):
         #
-        # Transform collider into blade's coordinate system.
+        # Provide input to other logic paths (a sensor might watch this).
         #
-        cPos = bat.bmath.to_local(self, collider.worldPosition)
+        recovering = self.jolt > 0
+        for i in numpy.nonzero(self.jolt == GrassSimulator.JOLT_FRAMES)[0]:
+            blades[i]['Jolted'] = False
+        self.jolt[recovering] -= 1
+        magnitude = numpy.sqrt((link * link).sum(axis=1))
+        jolted = ~recovering & (magnitude > GrassSimulator.JOLT_THRESHOLD)
+        self.jolt[jolted] = GrassSimulator.JOLT_FRAMES
+        for i in numpy.nonzero(jolted)[0]:
+            blades[i].on_jolt()
 
         #
-        # The blades are rotated 90 degrees to work better as Blender particles.
-        # But we're only interested in two axes. Re-map them to be X and Y.
+        # Move each link in the opposite direction to the preceding link. This
+        # is the same integration as bat.bmath.integrate.
         #
-        cPos = cPos.yz
+        for j in range(self.frame.shape[1]):
+            mask = self.mask[:, j, None]
+            frame = self.frame[:, j] - link
+            accel = frame * -self.spring
+            velocity = (self.velocity[:, j] + accel) * (1.0 - self.damping)
+            frame += velocity
+            self.frame[:, j] = numpy.where(mask, frame, 0.0)
+            self.velocity[:, j] = numpy.where(mask, velocity, 0.0)
+            link = velocity
+
+        changed = numpy.abs(self.frame - self.written) > GrassSimulator.PROP_EPSILON
+        for i, j, axis in zip(*numpy.nonzero(changed)):
+            blades[i][self.props[j][axis]] = float(self.frame[i, j, axis])
+        self.written[changed] = self.frame[changed]
+
+        offset = numpy.maximum(numpy.abs(self.frame), numpy.abs(self.velocity))
+        awake = offset.reshape(len(blades), -1).max(axis=1) >= GrassSimulator.SLEEP_THRESHOLD
+        if not awake.all():
+            for i in numpy.nonzero(~awake)[0]:
+                blades[i].rem_state(FlexibleObject.S_UPDATE)
+                self.slept.add(blades[i])
+            self.remove(awake)
 
-        #
-        # Collider bounding box.
-        #
-        colRad = collider['LODRadius']
-        colBox = bat.bmath.Box2D(cPos.x - colRad, cPos.y - colRad,
-                                cPos.x + colRad, cPos.y + colRad)
+class GrassBlade(FlexibleObject):
+
+    @bat.bats.profile('Scripts.foliage.GrassBlade.__init__')
+    def __init__(self, old_owner):
+        self.radY = self['GrassRadY']
+        self.radZ = self['GrassRadZ']
+        self.forceFactor = 100.0 / (4.0 * self.radY * self.radZ)
 
         #
-        # Perform axis-aligned 2D bounding box collision.
+        # Blades don't move, so the transform into the blade's coordinate
+        # system can be stored. The blades are rotated 90 degrees to work
+        # better as Blender particles, but we're only interested in two axes:
+        # keep the ones that become X and Y.
         #
-        colBox.intersect(self.bbox)
-        area = colBox.get_area()
+        origin = bat.bmath.to_local(self, bat.bmath.ZEROVEC)
+        axes = [bat.bmath.to_local(self, a) - origin for a in
+                (bat.bmath.XAXIS, bat.bmath.YAXIS, bat.bmath.ZAXIS)]
+        self.localX = (axes[0].y, axes[1].y, axes[2].y, origin.y)
+        self.localY = (axes[0].z, axes[1].z, axes[2].z, origin.z)
 
-        if area < 0.0:
-            #
-            # Boxes aren't touching; no force.
-            #
-            return ZERO2.copy()
+        FlexibleObject.__init__(self, old_owner)
 
-        areaFraction = area / self.bbox.get_area()
+    def get_collision_reach(self):
+        # Distance to the corner of the bounding box.
+        return math.hypot(self.radY, self.radZ) * max(self.worldScale)
 
-        cPos.normalize()
-        cPos = cPos * (areaFraction * 100.0)
+    def get_collision_force(self, collider):
+        return self.get_collision_forces((collider,))
+
+    def get_collision_forces(self, colliders):
+        '''Get the sum of the forces exerted by a number of colliders. Each
+        force is proportional to the area of overlap between the collider's
+        bounding box and the blade's, and points away from the blade.'''
+        xx, xy, xz, xw = self.localX
+        yx, yy, yz, yw = self.localY
+        radY = self.radY
+        radZ = self.radZ
+        forceX = 0.0
+        forceY = 0.0
+
+        for collider in colliders:
+            pos = collider.worldPosition
+            px = pos.x
+            py = pos.y
+            pz = pos.z
+            cx = xx * px + xy * py + xz * pz + xw
+            cy = yx * px + yy * py + yz * pz + yw
 
-        return cPos
+            #
+            # Perform axis-aligned 2D bounding box collision.
+            #
+            colRad = collider['LODRadius']
+            width = min(cx + colRad, radY) - max(cx - colRad, -radY)
+            if width <= 0.0:
+                continue
+            height = min(cy + colRad, radZ) - max(cy - colRad, -radZ)
+            if height <= 0.0:
+                continue
+
+            dist = math.sqrt(cx * cx + cy * cy)
+            if dist == 0.0:
+                continue
+            scale = width * height * self.forceFactor / dist
+            forceX += cx * scale
+            forceY += cy * scale
+
+        return mathutils.Vector((forceX, forceY))
 
 def flower_sound(c):
     sample = bat.sound.Sample(
@@ -32,7 +32,11 @@ import bat.impulse
 class UiController(bat.impulse.Handler, bat.bats.BX_GameObject,
         bge.types.KX_GameObject):
 
-    '''Manages UI elements: focus and click events.'''
+    '''Manages UI elements: focus and click events.
+
+    Widgets register themselves with the controller when they are shown, and
+    unregister when they are hidden; so navigating with the keyboard or joypad
+    only needs to consider the widgets on the current screen.'''
 
     _prefix = 'UC_'
 
@@ -43,8 +47,23 @@ class UiController(bat.impulse.Handler, bat.bats.BX_GameObject,
     #SOUND_DELAY_TICS = 5
     SOUND_DELAY_TICS = 0
 
+    # Directions that can be looked up in the neighbour graph. Keyboard input
+    # is always exactly one of these.
+    GRAPH_DIRECTIONS = {(1.0, 0.0), (-1.0, 0.0), (0.0, 1.0), (0.0, -1.0)}
+
     def __init__(self, old_owner):
         self.screen_stack = []
+
+        # Visible widgets, and the best neighbour of each in GRAPH_DIRECTIONS.
+        # The neighbour graph is filled in as it is used, and thrown away
+        # whenever the set of widgets changes (e.g. on screen change).
+        self.widgets = bat.containers.SafeSet()
+        self.neighbours = {}
+        for ob in self.scene.objects:
+            # Widgets that were shown before this controller was created.
+            if 'Widget' in ob and getattr(ob, 'is_visible', False):
+                self.register_widget(ob)
+
         bat.impulse.Input().add_handler(self, 'MAINMENU')
         bat.impulse.allow_mouse_capture = False
 
@@ -61,7 +80,15 @@ class UiController(bat.impulse.Handler, bat.bats.BX_GameObject,
         #bat.event.EventBus().replay_last('popScreen', self)
 
     def on_event(self, evt):
-        if evt.message == 'setScreen':
+        if evt.message == 'WidgetShown':
+            if evt.body is not None and evt.body.scene == self.scene:
+                self.register_widget(evt.body)
+        elif evt.message == 'WidgetHidden':
+            if evt.body is not None:
+                self.unregister_widget(evt.body)
+        elif evt.message == 'sensitivityChanged':
+            self.neighbours.clear()
+        elif evt.message == 'setScreen':
             self.screen_stack = [evt.body]
             self.update_screen()
         elif evt.message == 'switchScreen':
@@ -105,6 +132,18 @@ class UiController(bat.impulse.Handler, bat.bats.BX_GameObject,
     def get_default_widget(self, screen_name):
         return None
 
+    def register_widget(self, widget):
+        if widget in self.widgets:
+            return
+        self.widgets.add(widget)
+        self.neighbours.clear()
+
+    def unregister_widget(self, widget):
+        if widget not in self.widgets:
+            return
+        self.widgets.discard(widget)
+        self.neighbours.clear()
+
     @bat.bats.expose
     @bat.utils.controller_cls
     def mouseMove(self, c):
@@ -202,9 +241,31 @@ class UiController(bat.impulse.Handler, bat.bats.BX_GameObject,
             self.focus(widget)
 
     def find_next_widget(self, direction):
-        cam = self.scene.active_camera
         if self.current is not None and self.current.is_visible:
-            loc = self.current.worldPosition
+            current = self.current
+        else:
+            current = None
+
+        key = (current, direction.x, direction.y)
+        if (direction.x, direction.y) not in UiController.GRAPH_DIRECTIONS:
+            # Analogue input; too many possible directions to remember.
+            return self._find_next_widget(current, direction)
+
+        try:
+            widget = self.neighbours[key]
+        except KeyError:
+            widget = self._find_next_widget(current, direction)
+            self.neighbours[key] = widget
+        else:
+            if widget is not None and widget.invalid:
+                self.neighbours.clear()
+                widget = self._find_next_widget(current, direction)
+        return widget
+
+    def _find_next_widget(self, current, direction):
+        cam = self.scene.active_camera
+        if current is not None:
+            loc = current.worldPosition
         else:
             loc = mathutils.Vector((0.0, 0.0, 0.0))
         world_direction = bat.bmath.to_world_vec(cam, direction.resized(3))
@@ -214,8 +275,8 @@ class UiController(bat.impulse.Handler, bat.bats.BX_GameObject,
         # direction of the movement and the location of the current widget.
         best_widget = None
         best_score = 0.0
-        for ob in self.scene.objects:
-            if not 'Widget' in ob or not ob.is_visible or not ob.sensitive:
+        for ob in self.widgets:
+            if not ob.is_visible or not ob.sensitive:
                 continue
             ob_dir = ob.worldPosition - loc
             dist = ob_dir.magnitude
@@ -333,6 +394,8 @@ class Widget(bat.bats.BX_GameObject, bge.types.KX_GameObject):
                 self.enter()
 
     def hide(self):
+        if self.is_visible:
+            bat.event.EventBus().notify(bat.event.WeakEvent('WidgetHidden', self))
         self.should_be_visible = False
         self.is_visible = False
         self.setVisible(False, False)
@@ -352,6 +415,7 @@ class Widget(bat.bats.BX_GameObject, bge.types.KX_GameObject):
         self.add_state(Widget.S_VISIBLE)
         self.updateTargetFrame()
         self.updateVisibility(True)
+        bat.event.EventBus().notify(bat.event.WeakEvent('WidgetShown', self))
 
     def get_anim_range(self, target_ob=None):
         if target_ob is None:
@@ -55,6 +55,14 @@ def ripple(c):
 
 
 class SleepEmitter(bat.bats.BX_GameObject, bge.types.KX_GameObject):
+    '''Emits sleep particles. Emission starts when the emitter is created,
+    and stops when it is ended (see Scripts.story.ActSleepParticles).
+
+    The emitter is pulsed every tic by an Always sensor in Items.blend. It
+    could be scheduled instead (see Scripts.scheduler), but only once that
+    brick has been removed: until then, the brick would call into Python
+    every tic anyway.'''
+
     _prefix = 'S_'
 
     DELAY = 60
@@ -15,9 +15,12 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 #
 
+import json
 import logging
+import math
 
 import bge
+import mathutils
 
 import bat.containers
 import bat.event
@@ -40,6 +43,63 @@ class LightNode:
         return "LightNode(%d)" % self.index
 
 
+class VisibilityTable:
+    '''
+    Records which light nodes can be seen from each part of a level. The level
+    is divided into cubic cells; each cell lists the nodes that are visible
+    from it. Tables are baked offline by BScripts/bake_light_visibility.py.
+
+    Nodes are stored by position rather than index, so a table still works if
+    the game engine orders the polygons of the network differently from
+    Blender.
+    '''
+
+    log = logging.getLogger(__name__ + '.VisibilityTable')
+
+    def __init__(self, cell_size, cells):
+        self.cell_size = cell_size
+        self.cells = cells
+
+    @classmethod
+    def load(cls, path, network):
+        '''Load a table from a file, and match its nodes against a network.
+        @return: the table, or None if the file could not be read.'''
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except (IOError, ValueError) as e:
+            cls.log.info('No visibility table loaded from %s: %s', path, e)
+            return None
+
+        nodes = []
+        for pos in data['nodes']:
+            node = network.find_merge_node(network.grid, mathutils.Vector(pos))
+            if node is None:
+                cls.log.warn('Visibility table %s has a node at %s that is '
+                        'not in the network. Is the table out of date?',
+                        path, pos)
+            nodes.append(node)
+
+        cells = {}
+        for key, indices in data['cells'].items():
+            cell = tuple(int(i) for i in key.split(','))
+            cells[cell] = frozenset(nodes[i] for i in indices
+                    if nodes[i] is not None)
+
+        cls.log.info('Loaded visibility of %d nodes in %d cells from %s',
+                len(nodes), len(cells), path)
+        return cls(data['cell_size'], cells)
+
+    def visible_nodes(self, pos):
+        '''Get the nodes that can be seen from a point.
+        @return: a set of nodes, or None if the point is outside the baked
+            region.'''
+        size = self.cell_size
+        cell = (math.floor(pos.x / size), math.floor(pos.y / size),
+                math.floor(pos.z / size))
+        return self.cells.get(cell)
+
+
 class Lamp:
     log = logging.getLogger(__name__ + '.Lamp')
 
@@ -115,6 +175,141 @@ class Lamp:
         return "Lamp(%s)" % self.ob.name
 
 
+class RoomCuller:
+    '''
+    Hides objects that are in rooms far from the active node of a light
+    network, and suspends their logic and physics. The network stands in for
+    a portal graph: rooms that are more than a few nodes away can't be seen.
+
+    Objects opt in with a CullByRoom property. They belong to the node closest
+    to them; or, if the property names another object (e.g. an empty in the
+    middle of a room), to the node closest to that object. Only objects that
+    exist when the network is created are managed. The whole hierarchy of a
+    managed object is culled along with it.
+
+    Blender 2.69 can't tell whether an object's dynamics are suspended. So
+    objects whose own logic suspends their dynamics must also set the
+    DynamicsSuspended property while they are suspended; otherwise the culler
+    would restore them when it shows them again.
+    '''
+
+    log = logging.getLogger(__name__ + '.RoomCuller')
+
+    # A state with no logic bricks. Culled objects are put in this state so
+    # that their logic doesn't run. Objects that do have bricks in this state
+    # are left in their own state.
+    S_CULLED = 30
+
+    def __init__(self, network, depth):
+        self.depth = depth
+        self.members = {}
+        # Saved state of hidden objects: for each object in the hierarchy, its
+        # logic state, its visibility, and whether hide suspended its
+        # dynamics.
+        self.hidden = {}
+        # Names of objects that have logic bricks in S_CULLED.
+        self.unculled = set()
+
+        sce = network.scene
+        n_obs = 0
+        for ob in sce.objects:
+            if 'CullByRoom' not in ob:
+                continue
+            anchor = ob
+            if isinstance(ob['CullByRoom'], str):
+                try:
+                    anchor = sce.objects[ob['CullByRoom']]
+                except KeyError:
+                    RoomCuller.log.warn('%s: room anchor %s not found',
+                            ob.name, ob['CullByRoom'])
+            pos = anchor.worldPosition
+            node = min(network.nodes, key=lambda n: (pos - n.pos).magnitude)
+            if node not in self.members:
+                self.members[node] = bat.containers.SafeList()
+            self.members[node].append(ob)
+            n_obs += 1
+        RoomCuller.log.info('Culling %d objects in %d rooms', n_obs,
+                len(self.members))
+
+    def update(self, active):
+        '''Show the objects within 'depth' hops of the active node, and hide
+        the rest.'''
+        near = set([active])
+        frontier = [active]
+        for _ in range(self.depth):
+            next_frontier = []
+            for node in frontier:
+                for neighbour in node.neighbours:
+                    if neighbour not in near:
+                        near.add(neighbour)
+                        next_frontier.append(neighbour)
+            frontier = next_frontier
+
+        for node, obs in self.members.items():
+            if node in near:
+                for ob in obs:
+                    self.show(ob)
+            else:
+                for ob in obs:
+                    self.hide(ob)
+
+        # Forget objects that have been destroyed.
+        for ob in list(self.hidden.keys()):
+            if ob.invalid:
+                del self.hidden[ob]
+
+    def hide(self, ob):
+        if ob in self.hidden:
+            return
+        saved = []
+        for o in [ob] + list(ob.childrenRecursive):
+            suspended = self.has_dynamics(o)
+            saved.append((o, o.state, o.visible, suspended))
+            if self.can_cull_logic(o):
+                o.state = 1 << (RoomCuller.S_CULLED - 1)
+            if suspended:
+                o.suspendDynamics()
+        ob.setVisible(False, True)
+        self.hidden[ob] = saved
+
+    @staticmethod
+    def has_dynamics(ob):
+        '''Test whether an object has dynamics that can be suspended. Static
+        objects are left alone, as are objects that have been suspended by
+        their own logic.'''
+        if ob.getPhysicsId() == 0 or ob.mass <= 0.0:
+            return False
+        if ob.get('DynamicsSuspended', False):
+            return False
+        return True
+
+    def can_cull_logic(self, ob):
+        '''Test whether an object's logic can be stopped by moving it to
+        S_CULLED, i.e. whether it has no controllers in that state.'''
+        mask = 1 << (RoomCuller.S_CULLED - 1)
+        for c in ob.controllers:
+            if c.state & mask:
+                if ob.name not in self.unculled:
+                    self.unculled.add(ob.name)
+                    RoomCuller.log.warn('%s has logic in state %d; its logic '
+                            'will not be culled', ob.name, RoomCuller.S_CULLED)
+                return False
+        return True
+
+    def show(self, ob):
+        try:
+            saved = self.hidden.pop(ob)
+        except KeyError:
+            return
+        for o, state, visible, suspended in saved:
+            if o.invalid:
+                continue
+            o.visible = visible
+            o.state = state
+            if suspended and not o.get('DynamicsSuspended', False):
+                o.restoreDynamics()
+
+
 class LightNetwork(bat.bats.BX_GameObject, bge.types.KX_GameObject):
     '''
     Allows lights to be moved and reused between several rooms.
@@ -132,6 +327,15 @@ class LightNetwork(bat.bats.BX_GameObject, bge.types.KX_GameObject):
     have the name "UserLightN", where N is a number from 1-MAX_LAMPS. The number
     of lights required is equal to the maximum degree of any node in the network
     + 2, i.e. if the network has a 3-way intersection there should be 5 lights.
+
+    If a visibility table has been baked for the network (see VisibilityTable),
+    it is used to decide whether the closest node is visible instead of casting
+    a ray. The table is read from the file named by the VisibilityTable
+    property, or from DEFAULT_VISIBILITY_TABLE.
+
+    The network can also be used to hide distant rooms; see RoomCuller. The
+    CullDepth property sets how many nodes away from the active node objects
+    remain visible.
     '''
 
     _prefix = 'LN_'
@@ -140,20 +344,42 @@ class LightNetwork(bat.bats.BX_GameObject, bge.types.KX_GameObject):
 
     MERGE_THRESHOLD = 3.0
     MAX_LAMPS = 10
+    # How often to check whether a hidden node has come into view, in tics.
+    RETEST_INTERVAL = 10
+    DEFAULT_VISIBILITY_TABLE = '//{scene}_{network}.lightvis.json'
+    DEFAULT_CULL_DEPTH = 2
 
     def __init__(self, old_owner):
         self.current_node = None
+        # The closest node, and whether it could be seen when last tested.
+        self.candidate = None
+        self.candidate_visible = None
+        self.retest_delay = 0
         self.use_colours = 'UseVcol' in self and self['UseVcol']
         self.construct_node_graph()
+        self.load_visibility()
         self.gather_lamps()
+        self.culler = RoomCuller(self, self.get('CullDepth',
+                LightNetwork.DEFAULT_CULL_DEPTH))
         bat.event.EventBus().add_listener(self)
 
     def on_event(self, evt):
         if evt.message in {'TeleportSnail'}:
+            # The snail may now be far from the last closest node.
+            self.candidate = None
             for lamp in self.lamps:
                 lamp.instant = True
             self.update()
 
+    def load_visibility(self):
+        if 'VisibilityTable' in self:
+            path = self['VisibilityTable']
+        else:
+            path = LightNetwork.DEFAULT_VISIBILITY_TABLE.format(
+                    scene=self.scene.name, network=self.name)
+        self.visibility = VisibilityTable.load(bge.logic.expandPath(path),
+                self)
+
     def gather_lamps(self):
         self.lamps = []
         sce = self.scene
@@ -168,9 +394,11 @@ class LightNetwork(bat.bats.BX_GameObject, bge.types.KX_GameObject):
             LightNetwork.log.info("Found few lamps. Lamp objects should be named UserLightN.")
 
     def construct_node_graph(self):
-        # Create list of vertices and their connections.
-        # Would be nice to put this into a BSP tree one day...
+        # Create list of vertices and their connections. Nodes are also
+        # indexed by grid cell, so that close vertices can be found without
+        # comparing against every node.
         self.nodes = []
+        self.grid = grid = {}
         me = self.meshes[0]
         index = 0
         mat = self.worldTransform.copy()
@@ -200,21 +428,50 @@ class LightNetwork(bat.bats.BX_GameObject, bge.types.KX_GameObject):
 
             nodes = []
             for pos, col in zip(positions, colours):
-                node = None
-                for n in self.nodes:
-                    if (pos - n.pos).magnitude < LightNetwork.MERGE_THRESHOLD:
-                        node = n
-                        break
+                node = LightNetwork.find_merge_node(grid, pos)
                 if node is None:
                     node = LightNode(index, pos, col)
                     index += 1
                     self.nodes.append(node)
+                    cell = LightNetwork.grid_cell(pos)
+                    try:
+                        grid[cell].append(node)
+                    except KeyError:
+                        grid[cell] = [node]
                 nodes.append(node)
             nodes[0].neighbours.add(nodes[1])
             nodes[1].neighbours.add(nodes[0])
 
         LightNetwork.log.debug("Created network with %d nodes", len(self.nodes))
 
+    @staticmethod
+    def grid_cell(pos):
+        size = LightNetwork.MERGE_THRESHOLD
+        return (math.floor(pos.x / size), math.floor(pos.y / size),
+                math.floor(pos.z / size))
+
+    @staticmethod
+    def find_merge_node(grid, pos):
+        '''Find the node that a vertex should be merged with, if any. The
+        cells are as big as the merge threshold, so only the neighbouring cells
+        need to be searched. If several nodes are close enough, the oldest one
+        is chosen.'''
+        cx, cy, cz = LightNetwork.grid_cell(pos)
+        best = None
+        for x in (cx - 1, cx, cx + 1):
+            for y in (cy - 1, cy, cy + 1):
+                for z in (cz - 1, cz, cz + 1):
+                    try:
+                        nodes = grid[(x, y, z)]
+                    except KeyError:
+                        continue
+                    for n in nodes:
+                        if best is not None and n.index > best.index:
+                            continue
+                        if (pos - n.pos).magnitude < LightNetwork.MERGE_THRESHOLD:
+                            best = n
+        return best
+
     @bat.bats.expose
     def update(self):
         player = Scripts.director.Director().mainCharacter
@@ -229,25 +486,69 @@ class LightNetwork(bat.bats.BX_GameObject, bge.types.KX_GameObject):
             lamp.update()
 
     def find_closest_node(self, pos):
-        def distance_key(_n):
-            return (pos - _n.pos).magnitude
-        self.nodes.sort(key=distance_key)
+        n = self.walk_to_closest_node(pos)
+
+        if self.visibility is not None:
+            visible = self.visibility.visible_nodes(pos)
+            if visible is not None:
+                self.candidate = n
+                self.candidate_visible = n in visible
+                if self.candidate_visible:
+                    return n
+                else:
+                    return None
 
         # Just test closest node. Testing further nodes would result in an
         # unstable state: the lights flicker when the node becomes obscured
-        # momentarily.
-        n = self.nodes[0]
-
-        dist = (n.pos - pos).magnitude
-        hit_ob, _, _ = self.rayCast(n.pos, pos, dist, 'Ray')
-        if hit_ob is None or hit_ob is self:
+        # momentarily. The ray is only cast again when the closest node
+        # changes, or now and then while it is hidden.
+        if n is not self.candidate:
+            self.candidate = n
+            self.candidate_visible = None
+        elif not self.candidate_visible:
+            self.retest_delay -= 1
+            if self.retest_delay <= 0:
+                self.candidate_visible = None
+
+        if self.candidate_visible is None:
+            dist = (n.pos - pos).magnitude
+            hit_ob, _, _ = self.rayCast(n.pos, pos, dist, 'Ray')
+            self.candidate_visible = hit_ob is None or hit_ob is self
+            self.retest_delay = LightNetwork.RETEST_INTERVAL
+
+        if self.candidate_visible:
             return n
         else:
             return None
 
+    def walk_to_closest_node(self, pos):
+        '''Find the node closest to a point. The search starts from the
+        previous candidate and moves to whichever neighbour is closer, until
+        no neighbour is. If there is no previous candidate (e.g. after a
+        teleport), all nodes are searched.'''
+        def distance_key(_n):
+            return (pos - _n.pos).magnitude
+
+        n = self.candidate
+        if n is None:
+            return min(self.nodes, key=distance_key)
+
+        dist = distance_key(n)
+        while True:
+            best = n
+            for neighbour in n.neighbours:
+                d = distance_key(neighbour)
+                if d < dist:
+                    best = neighbour
+                    dist = d
+            if best is n:
+                return n
+            n = best
+
     def activate_node(self, node):
         LightNetwork.log.info('Activating node %d', node.index)
         self.current_node = node
+        self.culler.update(node)
 
         # Position a light at the current node, and all of its neighbours.
         nodes = set()
@@ -21,6 +21,7 @@ import bge
 import bat.bats
 
 import Scripts.director
+import Scripts.foliage
 
 ACTIVATION_TIMEOUT = 30
 DEBUG = False
@@ -73,7 +74,8 @@ class LODManager(metaclass=bat.bats.Singleton):
         deadTrees = []
 
         # Collect colliders
-        for actor in Scripts.director.Director().actors:
+        actors = list(Scripts.director.Director().actors)
+        for actor in actors:
             radius = 1.0
             try:
                 radius = actor['LODRadius']
@@ -81,6 +83,9 @@ class LODManager(metaclass=bat.bats.Singleton):
                 actor['LODRadius'] = 1.0
             boundsList.append(KCube(actor.worldPosition, radius))
 
+        # Foliage without sensors is touched by the same colliders.
+        Scripts.foliage.FoliageCollider().update(actors)
+
         if DEBUG:
             self.nodes_updated = 0
         
@@ -0,0 +1,244 @@
+#
+# Copyright 2009-2012 Alex Fraser <alex@phatcore.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+'''
+Runs callbacks at some future logic tic. Objects that only need to do
+something occasionally (e.g. respawn after a few minutes) can schedule a
+callback instead of being pulsed by an Always sensor every frame.
+'''
+
+import logging
+
+import bge
+
+import bat.bats
+
+class Task:
+    '''A scheduled callback. Returned by Scheduler.call_later; use it to cancel
+    or pause the callback.'''
+
+    def __init__(self, wheel, callback, owner):
+        self.wheel = wheel
+        self.callback = callback
+        self.owner = owner
+        self.due = 0
+        self.remaining = 0
+        self.generation = 0
+        self.active = False
+        self.paused = False
+
+    def cancel(self):
+        '''Stop the callback from running. Cancelled tasks can't be resumed.'''
+        self.generation += 1
+        self.active = False
+        self.paused = False
+
+    def pause(self):
+        '''Stop the countdown. The remaining time is kept until resume is
+        called.'''
+        if not self.active:
+            return
+        self.remaining = self.due - self.wheel.tic
+        self.generation += 1
+        self.active = False
+        self.paused = True
+
+    def resume(self):
+        '''Continue counting down from where pause left off.'''
+        if not self.paused:
+            return
+        self.paused = False
+        self.wheel.add(self, self.remaining)
+
+    @property
+    def pending(self):
+        return self.active or self.paused
+
+class TimingWheel:
+    '''A hierarchical timing wheel, counted in tics. Each level has SLOTS
+    slots; a slot on level n spans SLOTS ** n tics. Tasks are dropped into the
+    coarsest level that can hold them, and trickle down to finer levels as
+    their time approaches. Adding, cancelling and advancing are all constant
+    time, regardless of how many tasks are waiting.'''
+
+    SLOT_BITS = 6
+    SLOTS = 1 << SLOT_BITS
+    SLOT_MASK = SLOTS - 1
+    LEVELS = 4
+
+    def __init__(self):
+        self.tic = 0
+        self.levels = [[[] for _ in range(TimingWheel.SLOTS)]
+                for _ in range(TimingWheel.LEVELS)]
+
+    def add(self, task, delay):
+        '''Schedule a task to become due after 'delay' tics. A delay of less
+        than one tic runs on the next tic.'''
+        task.due = self.tic + max(int(delay), 1)
+        task.generation += 1
+        task.active = True
+        task.paused = False
+        self._insert(task)
+
+    def _insert(self, task):
+        delta = task.due - self.tic
+        level = 0
+        while (level < TimingWheel.LEVELS - 1 and
+                delta >= 1 << (TimingWheel.SLOT_BITS * (level + 1))):
+            level += 1
+        slot = (task.due >> (TimingWheel.SLOT_BITS * level)) & TimingWheel.SLOT_MASK
+        self.levels[level][slot].append((task, task.generation))
+
+    def advance(self):
+        '''Move forward by one tic.
+        @return: the tasks that are now due, in the order they were added.'''
+        self.tic += 1
+        tic = self.tic
+
+        # Cascade: when a finer level wraps around, the tasks in the next slot
+        # of the coarser level are redistributed.
+        for level in range(1, TimingWheel.LEVELS):
+            shift = TimingWheel.SLOT_BITS * level
+            if tic & ((1 << shift) - 1) != 0:
+                break
+            slots = self.levels[level]
+            slot = (tic >> shift) & TimingWheel.SLOT_MASK
+            entries = slots[slot]
+            slots[slot] = []
+            for task, generation in entries:
+                if task.generation == generation:
+                    self._insert(task)
+
+        slots = self.levels[0]
+        slot = tic & TimingWheel.SLOT_MASK
+        entries = slots[slot]
+        slots[slot] = []
+
+        due = []
+        for task, generation in entries:
+            if task.generation != generation:
+                # Cancelled or paused since it was added.
+                continue
+            if task.due > tic:
+                # Beyond the range of the top level; has been put back.
+                self._insert(task)
+                continue
+            task.active = False
+            due.append(task)
+        return due
+
+class Scheduler(metaclass=bat.bats.Singleton):
+    '''Runs callbacks after a number of logic tics. Each scene has its own
+    timeline, which advances once per logic tic while the scene is running; so
+    a callback will not run while its scene is suspended.
+
+    A scene's timeline is advanced by calling update once per logic tic from
+    that scene, e.g. from an Always sensor with true pulse. The Director and
+    the credits controller already do this for the level and end game scenes.
+    Other scenes (e.g. the menu) are advanced from their pre_draw callback
+    instead, which counts rendered frames rather than logic tics; the
+    callback is removed as soon as update is called from the scene.
+    '''
+
+    log = logging.getLogger(__name__ + '.Scheduler')
+
+    def __init__(self):
+        self.wheels = {}
+        # Scenes that call update.
+        self.driven = set()
+        # Fallback pre_draw callbacks, for scenes that don't.
+        self.drawHooks = {}
+
+    def call_later(self, delay, callback, owner=None, scene=None):
+        '''Run a callback after 'delay' logic tics.
+        @param delay: The number of tics to wait.
+        @param callback: A function that takes no arguments.
+        @param owner: The game object that the callback belongs to, if any. If
+            the owner has been destroyed by the time the callback is due, the
+            callback will not run. The callback runs on the owner's scene.
+        @param scene: The scene to run the callback on, if there is no owner.
+            Defaults to the current scene.
+        @return: a Task, which can be used to cancel or pause the callback.
+        '''
+        if owner is not None:
+            scene = owner.scene
+        elif scene is None:
+            scene = bge.logic.getCurrentScene()
+        wheel = self._get_wheel(scene)
+        task = Task(wheel, callback, owner)
+        wheel.add(task, delay)
+        return task
+
+    def call_after_seconds(self, seconds, callback, owner=None):
+        '''Like call_later, but the delay is given in seconds of game time.'''
+        delay = int(round(seconds * bge.logic.getLogicTicRate()))
+        return self.call_later(delay, callback, owner)
+
+    def _get_wheel(self, scene):
+        for sce in list(self.wheels.keys()):
+            if sce.invalid:
+                del self.wheels[sce]
+                self.drawHooks.pop(sce, None)
+        for sce in list(self.driven):
+            if sce.invalid:
+                self.driven.discard(sce)
+
+        try:
+            return self.wheels[scene]
+        except KeyError:
+            wheel = TimingWheel()
+            self.wheels[scene] = wheel
+            if scene not in self.driven:
+                hook = lambda: self.advance(scene)
+                scene.pre_draw.append(hook)
+                self.drawHooks[scene] = hook
+            return wheel
+
+    @bat.bats.expose
+    def update(self):
+        '''Advance the timeline of the current scene by one tic. Call this
+        once per logic tic.'''
+        self.drive(bge.logic.getCurrentScene())
+
+    def drive(self, scene):
+        '''Like advance, but also stops the scene's timeline from being
+        advanced by its pre_draw callback. Used by update.'''
+        if scene not in self.driven:
+            self.driven.add(scene)
+            hook = self.drawHooks.pop(scene, None)
+            if hook is not None:
+                scene.pre_draw.remove(hook)
+        self.advance(scene)
+
+    def advance(self, scene):
+        '''Advance the timeline of a scene by one tic, and run the callbacks
+        that are due.'''
+        if scene.suspended:
+            return
+        try:
+            wheel = self.wheels[scene]
+        except KeyError:
+            return
+
+        for task in wheel.advance():
+            if task.owner is not None and task.owner.invalid:
+                continue
+            try:
+                task.callback()
+            except Exception:
+                Scheduler.log.error('Scheduled callback %s failed',
+                        task.callback, exc_info=True)
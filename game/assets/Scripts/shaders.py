@@ -16,7 +16,9 @@
 #
 
 from string import Template
+import logging
 import math
+import time
 from collections import namedtuple
 
 import bge
@@ -27,6 +29,7 @@ import bat.store
 import bat.utils
 import bat.render
 
+import Scripts.scheduler
 import Scripts.webgl_noise
 
 DEBUG = False
@@ -34,7 +37,15 @@ DEBUG_LINE_NUMBERS = True
 
 LAMPDIR = (0.0, 0.0, 1.0)
 
+clock = getattr(time, 'perf_counter', time.time)
+
 Shaderdef = namedtuple('Shaderdef', ['shader', 'callback', 'uses_lights',
+            'needs_worldviewmat', 'needs_viewworldmat', 'wind'])
+
+ShaderVariant = namedtuple('ShaderVariant', ['model', 'alpha', 'twosided',
+            'frequency', 'amplitude'])
+
+ShaderSource = namedtuple('ShaderSource', ['vert', 'frag', 'uses_lights',
             'needs_worldviewmat', 'needs_viewworldmat'])
 
 class ShaderCtrl(metaclass=bat.bats.Singleton):
@@ -42,8 +53,20 @@ class ShaderCtrl(metaclass=bat.bats.Singleton):
 
     _prefix=""
 
+    log = logging.getLogger(__name__ + '.ShaderCtrl')
+
     def __init__(self):
         self.shaders = set()
+        # Shader definitions grouped by shader program; None when the shaders
+        # have changed.
+        self.groups = None
+        # The uniform values last given to each shader.
+        self.uploaded = {}
+        self.lights = None
+        self.lightsVersion = 0
+        self.nUniformCalls = 0
+        # Wind phases, by speed. Shared by all shaders with the same speed.
+        self.winds = {}
 #        self.set_mist_colour(mathutils.Vector((1.0, 1.0, 1.0)))
 #        self.set_mist_colour(mathutils.Vector((0.729, 0.729, 0.745)))
 #        self.set_mist_colour(mathutils.Vector((0.503, 0.503, 0.527)))
@@ -51,10 +74,11 @@ class ShaderCtrl(metaclass=bat.bats.Singleton):
         self.set_mist_depth(5000)
 
     def add_shader(self, shader, callback=None, uses_lights=True,
-                needs_worlviewmat=False, needs_viewworldmat=False):
+                needs_worlviewmat=False, needs_viewworldmat=False, wind=None):
 
         self.shaders.add(Shaderdef(shader, callback, uses_lights,
-                needs_worlviewmat, needs_viewworldmat))
+                needs_worlviewmat, needs_viewworldmat, wind))
+        self.groups = None
         self.update_globals_single(shader)
 
     def update_globals_single(self, shader):
@@ -95,6 +119,9 @@ class ShaderCtrl(metaclass=bat.bats.Singleton):
         '''
         Update light positions and other uniforms for the custom shaders. Any
         callbacks that were attached to the shaders will be run too.
+
+        Uniforms are only uploaded to a shader when their values differ from
+        the ones it was last given; a shader keeps its uniforms between frames.
         '''
         if len(self.shaders) == 0:
             return
@@ -105,149 +132,181 @@ class ShaderCtrl(metaclass=bat.bats.Singleton):
         world_to_camera_vec = world_to_camera.to_quaternion()
         camera_to_world = cam.camera_to_world
 
-        # SUN LIGHT (always sun)
-        light = sce.objects["KeyLight"]
-        key_light_dir = world_to_camera_vec * light.getAxisVect(LAMPDIR)
-        key_light_col = mathutils.Vector(light.color) * light.energy
-        key_light_col.resize_4d()
-        key_light_col.w = 1.0
+        lights = self.get_light_uniforms(sce, world_to_camera,
+                world_to_camera_vec)
+        if lights != self.lights:
+            self.lights = lights
+            self.lightsVersion += 1
 
-        # SKY LIGHT (always hemi)
-        light = sce.objects["FillLight1"]
-        fill_light1_dir = world_to_camera_vec * light.getAxisVect(LAMPDIR)
-        fill_light1_col = mathutils.Vector(light.color) * light.energy
-        fill_light1_col.resize_4d()
-        fill_light1_col.w = 1.0
+        if self.groups is None:
+            self._group_shaders()
 
-        # GROUND LIGHT (always hemi)
-        light = sce.objects["FillLight2"]
-        fill_light2_dir = world_to_camera_vec * light.getAxisVect(LAMPDIR)
-        fill_light2_col = mathutils.Vector(light.color) * light.energy
-        fill_light2_col.resize_4d()
-        fill_light2_col.w = 1.0
+        for wind in self.winds.values():
+            wind.update()
 
-        num_user_lights = 0
-        # CUSTOM LIGHT 1 - Anything other than Hemi (undetectable)
-        try:
-            light = sce.objects["UserLight1"]
-        except KeyError:
-            cust_light1_dir = mathutils.Vector((0.0, 0.0, 1.0))
-            cust_light1_col = mathutils.Vector((0.0, 0.0, 0.0, 0.0))
-            cust_light1_pos = mathutils.Vector((0.0, 0.0, 0.0, 0.0))
-            cust_light1_dist = 0.0
-            cust_light1_spotcutoff = 180.0
-            cust_light1_spotcoscutoff = -1.0
-            cust_light1_spotexponent = light.spotblend * 128.0
-        else:
-            num_user_lights += 1
-            cust_light1_dir = world_to_camera_vec * -light.getAxisVect(LAMPDIR)
-            cust_light1_col = mathutils.Vector(light.color) * light.energy
-            cust_light1_col.resize_4d()
-            if (light.type == light.SUN):
-                cust_light1_pos = cust_light1_dir.copy()
-                cust_light1_pos.resize_4d()
-                cust_light1_pos.w = 0.0
-                cust_light1_dist = 0.0
-            else:
-                cust_light1_pos = world_to_camera * light.worldPosition
-                cust_light1_pos.resize_4d()
-                cust_light1_pos.w = 1.0
-                cust_light1_dist = light.distance
-            if (light.type == light.SPOT):
-                cust_light1_spotcutoff = light.spotsize / 2.0
-                cust_light1_spotcoscutoff = math.cos(math.radians(
-                        cust_light1_spotcutoff))
-                cust_light1_spotexponent = light.spotblend * 128.0
-            else:
-                cust_light1_spotcutoff = 180.0
-                cust_light1_spotcoscutoff = -1.0
-                cust_light1_spotexponent = light.spotblend * 128.0
-
-        # CUSTOM LIGHT 2 - Anything other than Hemi (undetectable)
-        try:
-            light = sce.objects["UserLight2"]
-        except KeyError:
-            cust_light2_dir = mathutils.Vector((0.0, 0.0, 1.0))
-            cust_light2_col = mathutils.Vector((0.0, 0.0, 0.0, 0.0))
-            cust_light2_pos = mathutils.Vector((0.0, 0.0, 0.0, 0.0))
-            cust_light2_dist = 0.0
-            cust_light2_spotcutoff = 180.0
-            cust_light2_spotcoscutoff = -1.0
-            cust_light2_spotexponent = light.spotblend * 128.0
-        else:
-            num_user_lights += 1
-            cust_light2_dir = world_to_camera_vec * -light.getAxisVect(LAMPDIR)
-            cust_light2_col = mathutils.Vector(light.color) * light.energy
-            cust_light2_col.resize_4d()
-            if (light.type == light.SUN):
-                cust_light2_pos = cust_light2_dir.copy()
-                cust_light2_pos.resize_4d()
-                cust_light2_pos.w = 0.0
-                cust_light2_dist = 0.0
-            else:
-                cust_light2_pos = world_to_camera * light.worldPosition
-                cust_light2_pos.resize_4d()
-                cust_light2_pos.w = 1.0
-                cust_light2_dist = light.distance
-            if (light.type == light.SPOT):
-                cust_light2_spotcutoff = light.spotsize / 2.0
-                cust_light2_spotcoscutoff = math.cos(math.radians(
-                        cust_light2_spotcutoff))
-                cust_light2_spotexponent = light.spotblend * 128.0
-            else:
-                cust_light2_spotcutoff = 180.0
-                cust_light2_spotcoscutoff = -1.0
-                cust_light2_spotexponent = light.spotblend * 128.0
-
-        # Iterate over all registered materials and update uniforms
-
-        deadShaders = []
-        for sc in self.shaders:
-            shader = sc.shader
+        self.nUniformCalls = 0
+        deadShaders = False
+        for shader, defs in self.groups.items():
             if shader.invalid:
-                deadShaders.append(sc)
-
-            if sc.callback is not None:
-                sc.callback(shader, world_to_camera, world_to_camera_vec)
-
-            if sc.needs_worldviewmat:
-                shader.setUniformMatrix4('worldViewMatrix', world_to_camera)
-            if sc.needs_viewworldmat:
-                shader.setUniformMatrix4('worldViewMatrixInverse', camera_to_world)
+                deadShaders = True
+                continue
 
-            if not sc.uses_lights:
+            for sc in defs:
+                if sc.callback is not None:
+                    sc.callback(shader, world_to_camera, world_to_camera_vec)
+
+            uploaded = self.uploaded[shader]
+            for sc in defs:
+                if sc.wind is not None:
+                    self._set_uniform(shader, uploaded, 'phase', sc.wind.value)
+            if any(sc.needs_worldviewmat for sc in defs):
+                self._set_uniform_matrix(shader, uploaded, 'worldViewMatrix',
+                        world_to_camera)
+            if any(sc.needs_viewworldmat for sc in defs):
+                self._set_uniform_matrix(shader, uploaded,
+                        'worldViewMatrixInverse', camera_to_world)
+
+            if not any(sc.uses_lights for sc in defs):
                 continue
+            if uploaded.get('lightsVersion') == self.lightsVersion:
+                continue
+            uploaded['lightsVersion'] = self.lightsVersion
+            for name, value in self.lights.items():
+                self._set_uniform(shader, uploaded, name, value)
+
+        if deadShaders:
+            self.shaders = set(sc for sc in self.shaders
+                    if not sc.shader.invalid)
+            self.groups = None
+
+        ShaderCtrl.log.debug('%d uniforms uploaded', self.nUniformCalls)
+
+    def _group_shaders(self):
+        '''Gather the definitions by shader. Several objects may share a
+        material, and therefore a shader program; the uniforms only need to be
+        uploaded to it once.'''
+        self.groups = {}
+        for sc in self.shaders:
+            try:
+                self.groups[sc.shader].append(sc)
+            except KeyError:
+                self.groups[sc.shader] = [sc]
+
+        # Forget shaders and winds that are no longer in use.
+        speeds = set(sc.wind.speed for sc in self.shaders
+                if sc.wind is not None)
+        for speed in list(self.winds.keys()):
+            if speed not in speeds:
+                del self.winds[speed]
+        for shader in list(self.uploaded.keys()):
+            if shader not in self.groups:
+                del self.uploaded[shader]
+        for shader in self.groups.keys():
+            if shader not in self.uploaded:
+                self.uploaded[shader] = {}
+
+    def get_wind(self, speed):
+        '''Get the wind phase for a speed. Shaders that use the same speed
+        share a Wind, so it is only calculated once per frame.'''
+        try:
+            return self.winds[speed]
+        except KeyError:
+            wind = Wind(speed)
+            self.winds[speed] = wind
+            return wind
 
-            shader.setUniform3f("key_light_dir", key_light_dir.x, key_light_dir.y, key_light_dir.z)
-            shader.setUniform4f("key_light_col", key_light_col.x, key_light_col.y, key_light_col.z, 1.0)
+    def _set_uniform(self, shader, uploaded, name, value):
+        if uploaded.get(name) == value:
+            return
+        uploaded[name] = value
+        if isinstance(value, float):
+            shader.setUniform1f(name, value)
+        else:
+            shader.setUniformfv(name, value)
+        self.nUniformCalls += 1
 
-            shader.setUniformfv("fill_light1_dir", fill_light1_dir)
-            shader.setUniformfv("fill_light1_col", fill_light1_col)
+    def _set_uniform_matrix(self, shader, uploaded, name, matrix):
+        value = tuple(tuple(row) for row in matrix)
+        if uploaded.get(name) == value:
+            return
+        uploaded[name] = value
+        shader.setUniformMatrix4(name, matrix)
+        self.nUniformCalls += 1
 
-            shader.setUniformfv("fill_light2_dir", fill_light2_dir)
-            shader.setUniformfv("fill_light2_col", fill_light2_col)
+    def get_light_uniforms(self, sce, world_to_camera, world_to_camera_vec):
+        '''Calculate the values of the lighting uniforms for this frame.
+        @return: a dictionary of uniform values. Values are floats or tuples.'''
+        lights = {}
 
-            shader.setUniformfv("cust_light1_pos", cust_light1_pos)
-            shader.setUniformfv("cust_light1_dir", cust_light1_dir)
-            shader.setUniformfv("cust_light1_col", cust_light1_col)
-            shader.setUniform1f("cust_light1_spotcutoff", cust_light1_spotcutoff)
-            shader.setUniform1f("cust_light1_spotcoscutoff", cust_light1_spotcoscutoff)
-            shader.setUniform1f("cust_light1_spotexponent", cust_light1_spotexponent)
-            shader.setUniform1f("cust_light1_dist", cust_light1_dist)
+        # SUN LIGHT (always sun)
+        light = sce.objects["KeyLight"]
+        lights['key_light_dir'] = tuple(
+                world_to_camera_vec * light.getAxisVect(LAMPDIR))
+        lights['key_light_col'] = self._light_colour(light)
 
-            shader.setUniformfv("cust_light2_pos", cust_light2_pos)
-            shader.setUniformfv("cust_light2_dir", cust_light2_dir)
-            shader.setUniformfv("cust_light2_col", cust_light2_col)
-            shader.setUniform1f("cust_light2_spotcutoff", cust_light2_spotcutoff)
-            shader.setUniform1f("cust_light2_spotcoscutoff", cust_light2_spotcoscutoff)
-            shader.setUniform1f("cust_light2_spotexponent", cust_light2_spotexponent)
-            shader.setUniform1f("cust_light2_dist", cust_light2_dist)
+        # SKY LIGHT (always hemi)
+        light = sce.objects["FillLight1"]
+        lights['fill_light1_dir'] = tuple(
+                world_to_camera_vec * light.getAxisVect(LAMPDIR))
+        lights['fill_light1_col'] = self._light_colour(light)
 
-        for sc in deadShaders:
-            self.shaders.remove(sc)
+        # GROUND LIGHT (always hemi)
+        light = sce.objects["FillLight2"]
+        lights['fill_light2_dir'] = tuple(
+                world_to_camera_vec * light.getAxisVect(LAMPDIR))
+        lights['fill_light2_col'] = self._light_colour(light)
+
+        # CUSTOM LIGHTS - Anything other than Hemi (undetectable)
+        self._user_light_uniforms(sce, 'UserLight1', 'cust_light1_', lights,
+                world_to_camera, world_to_camera_vec)
+        self._user_light_uniforms(sce, 'UserLight2', 'cust_light2_', lights,
+                world_to_camera, world_to_camera_vec)
+
+        return lights
+
+    @staticmethod
+    def _light_colour(light):
+        col = mathutils.Vector(light.color) * light.energy
+        return (col.x, col.y, col.z, 1.0)
+
+    @staticmethod
+    def _user_light_uniforms(sce, obname, prefix, lights, world_to_camera,
+            world_to_camera_vec):
+        try:
+            light = sce.objects[obname]
+        except KeyError:
+            lights[prefix + 'dir'] = (0.0, 0.0, 1.0)
+            lights[prefix + 'col'] = (0.0, 0.0, 0.0, 0.0)
+            lights[prefix + 'pos'] = (0.0, 0.0, 0.0, 0.0)
+            lights[prefix + 'dist'] = 0.0
+            lights[prefix + 'spotcutoff'] = 180.0
+            lights[prefix + 'spotcoscutoff'] = -1.0
+            lights[prefix + 'spotexponent'] = 0.0
+            return
+
+        direction = world_to_camera_vec * -light.getAxisVect(LAMPDIR)
+        col = mathutils.Vector(light.color) * light.energy
+        lights[prefix + 'dir'] = tuple(direction)
+        lights[prefix + 'col'] = (col.x, col.y, col.z, 1.0)
+        if (light.type == light.SUN):
+            lights[prefix + 'pos'] = (direction.x, direction.y, direction.z, 0.0)
+            lights[prefix + 'dist'] = 0.0
+        else:
+            pos = world_to_camera * light.worldPosition
+            lights[prefix + 'pos'] = (pos.x, pos.y, pos.z, 1.0)
+            lights[prefix + 'dist'] = float(light.distance)
+        if (light.type == light.SPOT):
+            spotcutoff = light.spotsize / 2.0
+            lights[prefix + 'spotcutoff'] = spotcutoff
+            lights[prefix + 'spotcoscutoff'] = math.cos(math.radians(
+                    spotcutoff))
+        else:
+            lights[prefix + 'spotcutoff'] = 180.0
+            lights[prefix + 'spotcoscutoff'] = -1.0
+        lights[prefix + 'spotexponent'] = light.spotblend * 128.0
 
 
-def _set_shader(ob, vert_shader, frag_shader, callback=None):
+def _set_shader(ob, source, callback=None, wind=None):
     me = ob.meshes[0]
     mat = me.materials[0]
 
@@ -255,22 +314,16 @@ def _set_shader(ob, vert_shader, frag_shader, callback=None):
         return
 
     if DEBUG:
-        _print_code(vert_shader)
-        _print_code(frag_shader)
+        _print_code(source.vert)
+        _print_code(source.frag)
 
     shader = mat.getShader()
     if shader is not None:
         if not shader.isValid():
-            shader.setSource(vert_shader, frag_shader, True)
+            shader.setSource(source.vert, source.frag, True)
         shader.setSampler("tCol", 0)
-        uses_lights = ("vec3 key_light_dir" in vert_shader or
-                "vec3 key_light_dir" in frag_shader)
-        needs_worlviewmat = ("mat4 worldViewMatrix" in vert_shader or
-                "mat4 worldViewMatrix" in frag_shader)
-        needs_viewworldmat = ("mat4 worldViewMatrixInverse" in vert_shader or
-                "mat4 worldViewMatrixInverse" in frag_shader)
-        ShaderCtrl().add_shader(shader, callback, uses_lights,
-                needs_worlviewmat, needs_viewworldmat)
+        ShaderCtrl().add_shader(shader, callback, source.uses_lights,
+                source.needs_worldviewmat, source.needs_viewworldmat, wind)
     return shader
 
 
@@ -283,23 +336,11 @@ def _print_code(text):
             print(line)
 
 
-@bat.utils.all_sensors_positive
-@bat.utils.owner
-def set_basic_shader(ob):
+def get_variant(ob, windy=False):
     '''
-    Uses a standard shader.
-
-    Game object properties:
-     - SH_alpha: Opacity mode, in {'CLIP', 'BLEND', 'OPAQUE'}. Defaults to
-       'CLIP'.
-     - SH_model: Lighting model in {'SHADELESS', 'GOURAUD', 'PHONG'}. Defaults
-       to 'PHONG'.
-     - SH_twosided: Whether to do two-sided lighting. Defaults to False.
+    Find out which shader variant an object uses, from its SH_* properties.
+    See set_basic_shader and set_windy for a description of the properties.
     '''
-
-    if not bat.store.get('/opt/foliage', True) or not bat.store.get('/opt/depthOfField', True):
-        return
-
     if 'SH_alpha' in ob:
         alpha = ob['SH_alpha']
     else:
@@ -307,6 +348,8 @@ def set_basic_shader(ob):
 
     if 'SH_model' in ob:
         model = ob['SH_model']
+    elif windy:
+        model = 'GOURAUD'
     else:
         model = 'PHONG'
 
@@ -315,8 +358,72 @@ def set_basic_shader(ob):
     else:
         twosided = False
 
-    _set_shader(ob, create_vert_shader(model=model),
-            create_frag_shader(model=model, alpha=alpha, twosided=twosided))
+    if windy:
+        # Always floats, so that e.g. 1 and 1.0 are the same variant (and so
+        # the GLSL constants are written as floats).
+        frequency = float(ob["SH_freq"])
+        amplitude = float(ob["SH_amp"])
+    else:
+        frequency = None
+        amplitude = None
+
+    return ShaderVariant(model, alpha, twosided, frequency, amplitude)
+
+
+# Generated shader sources, by variant.
+_sources = {}
+
+def get_source(variant):
+    '''
+    Get the vertex and fragment shader sources for a variant. The sources are
+    only generated the first time a variant is requested; after that, all
+    materials that use the variant share the same source.
+    '''
+    try:
+        return _sources[variant]
+    except KeyError:
+        pass
+
+    if variant.frequency is not None:
+        position_fn = WINDY_POSITION_FN.substitute(
+                frequency=variant.frequency, amplitude=variant.amplitude)
+    else:
+        position_fn = None
+
+    vert = create_vert_shader(model=variant.model, position_fn=position_fn)
+    frag = create_frag_shader(model=variant.model, alpha=variant.alpha,
+            twosided=variant.twosided)
+    uses_lights = ("vec3 key_light_dir" in vert or
+            "vec3 key_light_dir" in frag)
+    needs_worldviewmat = ("mat4 worldViewMatrix" in vert or
+            "mat4 worldViewMatrix" in frag)
+    needs_viewworldmat = ("mat4 worldViewMatrixInverse" in vert or
+            "mat4 worldViewMatrixInverse" in frag)
+
+    source = ShaderSource(vert, frag, uses_lights, needs_worldviewmat,
+            needs_viewworldmat)
+    _sources[variant] = source
+    return source
+
+
+@bat.utils.all_sensors_positive
+@bat.utils.owner
+def set_basic_shader(ob):
+    '''
+    Uses a standard shader.
+
+    Game object properties:
+     - SH_alpha: Opacity mode, in {'CLIP', 'BLEND', 'OPAQUE'}. Defaults to
+       'CLIP'.
+     - SH_model: Lighting model in {'SHADELESS', 'GOURAUD', 'PHONG'}. Defaults
+       to 'PHONG'.
+     - SH_twosided: Whether to do two-sided lighting. Defaults to False.
+    '''
+
+    if not bat.store.get('/opt/foliage', True) or not bat.store.get('/opt/depthOfField', True):
+        return
+
+    _set_shader(ob, get_source(get_variant(ob)))
 
 
 @bat.utils.all_sensors_positive
@@ -342,22 +449,13 @@ def set_windy(ob):
     if not bat.store.get('/opt/foliage', True) or not bat.store.get('/opt/depthOfField', True):
         return
 
-    if 'SH_alpha' in ob:
-        alpha = ob['SH_alpha']
-    else:
-        alpha = 'CLIP'
-    if 'SH_model' in ob:
-        model = ob['SH_model']
-    else:
-        model = 'GOURAUD'
-    if 'SH_twosided' in ob:
-        twosided = ob['SH_twosided']
-    else:
-        twosided = False
+    source = get_source(get_variant(ob, windy=True))
+    wind = ShaderCtrl().get_wind(ob["SH_speed"])
+    _set_shader(ob, source, wind=wind)
 
-    # Use the regular shaders, but replace the position function.
 
-    POSITION_FN = Template(Scripts.webgl_noise.NOISE_FN + """
+# Use the regular shaders, but replace the position function.
+WINDY_POSITION_FN = Template(Scripts.webgl_noise.NOISE_FN + """
 
     const float PI2 = 2.0 * 3.14159;
     const float FREQ = ${frequency} * 0.001;
@@ -387,18 +485,120 @@ def set_windy(ob):
     }
 
     """)
-    position_fn = POSITION_FN.substitute(frequency=ob["SH_freq"],
-            amplitude=ob["SH_amp"])
 
-    verts = create_vert_shader(model=model, position_fn=position_fn)
-    frags = create_frag_shader(model=model, alpha=alpha, twosided=twosided)
-    cb = WindCallback(ob["SH_speed"])
-    shader = _set_shader(ob, verts, frags, cb)
 
+# The functions that set up custom shaders, as named by Python controllers.
+SHADER_SCRIPTS = {
+    'Scripts.shaders.set_basic_shader': False,
+    'Scripts.shaders.set_windy': True,
+    }
+
+def find_shader_variants(scene):
+    '''
+    Find the custom shader variants used by the objects in a scene, including
+    inactive objects (which may be added to the scene later). Objects are
+    recognised by their Python controllers.
+    @return: a dictionary of materials, by variant.
+    '''
+    variants = {}
+    seen = set()
+    for ob in list(scene.objects) + list(scene.objectsInactive):
+        windy = None
+        for c in ob.controllers:
+            script = getattr(c, 'script', None)
+            if script in SHADER_SCRIPTS:
+                windy = SHADER_SCRIPTS[script]
+                break
+        if windy is None:
+            continue
+
+        try:
+            mat = ob.meshes[0].materials[0]
+        except IndexError:
+            continue
+        if mat in seen or not hasattr(mat, "getShader"):
+            continue
+        seen.add(mat)
+
+        variant = get_variant(ob, windy=windy)
+        try:
+            variants[variant].append(mat)
+        except KeyError:
+            variants[variant] = [mat]
+    return variants
+
+
+class Prewarmer:
+    '''
+    Compiles the custom shaders of a scene ahead of time, e.g. while the
+    loading screen is shown. Compilation is spread over several frames so that
+    the loading screen stays responsive. When all shaders have been compiled,
+    the callback is run and the compile time of each variant is logged.
+    '''
+
+    log = logging.getLogger(__name__ + '.Prewarmer')
+
+    # Time to spend compiling each frame, in seconds.
+    BUDGET = 0.05
+
+    def __init__(self, owner, callback):
+        self.owner = owner
+        self.callback = callback
+        self.pending = []
+        self.timings = {}
+        if bat.store.get('/opt/foliage', True) and bat.store.get('/opt/depthOfField', True):
+            for variant, mats in find_shader_variants(owner.scene).items():
+                for mat in mats:
+                    self.pending.append((variant, mat))
+
+    def start(self):
+        Prewarmer.log.info('Compiling shaders for %d materials',
+                len(self.pending))
+        self.step()
+
+    def step(self):
+        start = clock()
+        while len(self.pending) > 0 and clock() - start < Prewarmer.BUDGET:
+            variant, mat = self.pending.pop()
+            self.compile(variant, mat)
+
+        if len(self.pending) > 0:
+            Scripts.scheduler.Scheduler().call_later(1, self.step,
+                    owner=self.owner)
+        else:
+            self.report()
+            self.callback()
 
-class WindCallback:
+    def compile(self, variant, mat):
+        shader = mat.getShader()
+        if shader is None or shader.isValid():
+            # Already compiled, e.g. by the object's own controller.
+            return
+        source = get_source(variant)
+        start = clock()
+        shader.setSource(source.vert, source.frag, True)
+        elapsed = clock() - start
+        if not shader.isValid():
+            Prewarmer.log.error('Shader %s failed to compile', variant)
+
+        try:
+            timing = self.timings[variant]
+        except KeyError:
+            timing = self.timings[variant] = [0.0, 0]
+        timing[0] += elapsed
+        timing[1] += 1
+
+    def report(self):
+        for variant, (elapsed, n) in sorted(self.timings.items(),
+                key=lambda item: -item[1][0]):
+            Prewarmer.log.info('%s: %d materials in %.1fms', variant, n,
+                    elapsed * 1000.0)
+
+
+class Wind:
     '''
-    Makes the leaves move. Called once per frame per instance of the shader.
+    Makes the leaves move. Updated once per frame by ShaderCtrl, and shared by
+    all windy shaders with the same speed.
     '''
 
     # PHASE_STEPX = (1.0/3.0) * 0.0001
@@ -406,18 +606,20 @@ class WindCallback:
     PHASE_STEP = 0.00001
 
     def __init__(self, speed):
-        self.speed = WindCallback.PHASE_STEP * speed
+        self.speed = speed
+        self.step = Wind.PHASE_STEP * speed
         self.phase = 1.999 * math.pi
+        self.value = (0.0, 0.0)
 
-    def __call__(self, shader, world_to_cam, world_to_cam_vec):
+    def update(self):
         # Set displacement texture lookup offset
         # self.phasex = (self.phasex + self.speedx) % 289
         # self.phasey = (self.phasey + self.speedy) % 289
-        self.phase = (self.phase + self.speed) % (2 * math.pi)
+        self.phase = (self.phase + self.step) % (2 * math.pi)
         phasex = math.sin(self.phase) * 1000
         phasey = math.cos(self.phase) * 1000
         # print(self.phase, phasex, phasey)
-        shader.setUniform2f("phase", phasex, phasey)
+        self.value = (phasex, phasey)
 
 
 calc_light = """
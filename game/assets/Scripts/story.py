@@ -28,6 +28,7 @@ import Scripts.snail
 import Scripts.camera
 import Scripts.director
 import Scripts.inventory
+import Scripts.shaders
 
 GRAVITY = 75.0
 
@@ -269,6 +270,11 @@ class GameLevel(Level):
 
         bat.event.EventBus().add_listener(self)
 
+        # Keep the loading screen up until the shaders have been compiled.
+        bat.event.Event('StartLoading', self).send()
+        Scripts.shaders.Prewarmer(self, self.on_shaders_compiled).start()
+
+    def on_shaders_compiled(self):
         if 'InitCamera' in self.scene.objects:
             log.info('Setting initial camera location to cache shaders')
             init_cam = self.scene.objects['InitCamera']
@@ -276,10 +282,11 @@ class GameLevel(Level):
             init_cam['Priority'] = 2
             # Make sure the loading screen stays until one frame has been
             # rendered by the init camera.
-            bat.event.Event('StartLoading', self).send()
             bat.event.Event('AddCameraGoal', 'InitCamera').send(2)
             bat.event.Event('FinishLoading', self).send(3)
             bat.event.Event('RemoveCameraGoal', 'InitCamera').send(4)
+        else:
+            bat.event.Event('FinishLoading', self).send()
 
     def spawn(self):
         scene = bge.logic.getCurrentScene()
@@ -15,11 +15,24 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 #
 
+import json
+import os
+import tempfile
 import unittest
 
+import bge
+import mathutils
+
 import bat.bats
 import bat.containers
 
+import Scripts.bendyleaf
+import Scripts.camera
+import Scripts.lighting
+import Scripts.scheduler
+import Scripts.text_layout
+import Scripts.webgl_noise
+
 class PriorityStackTest(unittest.TestCase):
     '''bat.containers.SafePriorityStack'''
 
@@ -123,8 +136,370 @@ class FuzzySwitchTest(unittest.TestCase):
         self.sw.turn_on()
         self.assertTrue(self.sw.is_on())
 
+class PathSearchTest(unittest.TestCase):
+    '''Scripts.camera.PathCamera._searchVisibleRun'''
+
+    class DummyNode:
+        def __init__(self, visible):
+            self.visible = visible
+
+        def is_visible_from(self, camera):
+            camera.nTested += 1
+            return self.visible
+
+    class DummyCamera:
+        def __init__(self, visibility, delay):
+            self.path = [PathSearchTest.DummyNode(v) for v in visibility]
+            self.NODE_DELAY = delay
+            self.nTested = 0
+
+    def search(self, visibility, delay):
+        camera = PathSearchTest.DummyCamera(visibility, delay)
+        return Scripts.camera.PathCamera._searchVisibleRun(camera)
+
+    def scan(self, visibility, delay):
+        camera = PathSearchTest.DummyCamera(visibility, delay)
+        return Scripts.camera.PathCamera._scanVisibleRun(camera)
+
+    def test_all_paths(self):
+        # Every short path, with every run length.
+        for delay in range(1, 5):
+            for n in range(11):
+                for bits in range(1 << n):
+                    visibility = [bits & (1 << i) != 0 for i in range(n)]
+                    self.assertEquals(self.search(visibility, delay),
+                            self.scan(visibility, delay), visibility)
+
+    def test_run_between_probes(self):
+        # A bisecting search would skip nodes 4-6, and find nodes 15-17.
+        visibility = ([False] * 4 + [True] * 3 + [False] * 8 + [True] * 5)
+        self.assertEquals(self.search(visibility, 3), 6)
+        self.assertEquals(self.scan(visibility, 3), 6)
+
+    def test_hidden_nodes_skipped(self):
+        visibility = [False] * 30 + [True] * 3
+        camera = PathSearchTest.DummyCamera(visibility, 3)
+        self.assertEquals(
+                Scripts.camera.PathCamera._searchVisibleRun(camera), 32)
+        self.assertLess(camera.nTested, 20)
+
+class VisibilityTableTest(unittest.TestCase):
+    '''Scripts.lighting.VisibilityTable'''
+
+    class DummyNode:
+        def __init__(self, index, pos):
+            self.index = index
+            self.pos = mathutils.Vector(pos)
+
+    class DummyNetwork:
+        def __init__(self, positions):
+            self.nodes = []
+            self.grid = {}
+            for i, pos in enumerate(positions):
+                node = VisibilityTableTest.DummyNode(i, pos)
+                self.nodes.append(node)
+                cell = Scripts.lighting.LightNetwork.grid_cell(node.pos)
+                self.grid.setdefault(cell, []).append(node)
+
+        def find_merge_node(self, grid, pos):
+            return Scripts.lighting.LightNetwork.find_merge_node(grid, pos)
+
+    TABLE = {
+        'cell_size': 2.0,
+        # The last node is not in the network.
+        'nodes': [[0.0, 0.0, 0.0], [10.0, 0.0, 0.0], [50.0, 50.0, 50.0]],
+        'cells': {
+            '0,0,0': [0],
+            '1,0,0': [0, 1],
+            '-1,0,0': [0, 2],
+            },
+        }
+
+    def setUp(self):
+        # The network's vertices are a little off from the baked nodes.
+        self.network = VisibilityTableTest.DummyNetwork(
+                [(0.1, 0.0, 0.0), (10.0, 0.2, 0.0)])
+        fd, self.path = tempfile.mkstemp(suffix='.lightvis.json')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(VisibilityTableTest.TABLE, f)
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def test_load(self):
+        table = Scripts.lighting.VisibilityTable.load(self.path, self.network)
+        n0, n1 = self.network.nodes
+        self.assertEquals(table.visible_nodes(mathutils.Vector((1, 1, 1))),
+                {n0})
+        self.assertEquals(table.visible_nodes(mathutils.Vector((3, 0, 0))),
+                {n0, n1})
+        self.assertEquals(table.visible_nodes(mathutils.Vector((-1, 0, 0))),
+                {n0})
+
+    def test_outside(self):
+        table = Scripts.lighting.VisibilityTable.load(self.path, self.network)
+        self.assertIsNone(table.visible_nodes(mathutils.Vector((0, 5, 0))))
+
+    def test_missing(self):
+        table = Scripts.lighting.VisibilityTable.load(self.path + '.missing',
+                self.network)
+        self.assertIsNone(table)
+
+class TimingWheelTest(unittest.TestCase):
+    '''Scripts.scheduler.TimingWheel'''
+
+    def setUp(self):
+        self.wheel = Scripts.scheduler.TimingWheel()
+
+    def make_task(self, delay):
+        task = Scripts.scheduler.Task(self.wheel, None, None)
+        self.wheel.add(task, delay)
+        return task
+
+    def run_until_due(self, task, limit):
+        for _ in range(limit):
+            if task in self.wheel.advance():
+                return self.wheel.tic
+        return None
+
+    def test_short(self):
+        task = self.make_task(10)
+        self.assertEquals(self.run_until_due(task, 100), 10)
+        self.assertFalse(task.pending)
+
+    def test_cascade(self):
+        # Long enough to be stored on the third level.
+        delay = 5 * 64 * 64 + 3 * 64 + 7
+        task = self.make_task(delay)
+        self.assertEquals(self.run_until_due(task, delay + 1), delay)
+
+    def test_cancel(self):
+        task = self.make_task(70)
+        task.cancel()
+        self.assertIsNone(self.run_until_due(task, 200))
+
+    def test_pause(self):
+        task = self.make_task(20)
+        for _ in range(5):
+            self.wheel.advance()
+        task.pause()
+        for _ in range(100):
+            self.assertNotIn(task, self.wheel.advance())
+        task.resume()
+        self.assertEquals(self.run_until_due(task, 100), 120)
+
+class SchedulerTest(unittest.TestCase):
+    '''Scripts.scheduler.Scheduler'''
+
+    class DummyScene:
+        def __init__(self):
+            self.suspended = False
+            self.invalid = False
+            self.pre_draw = []
+
+    class DummyOwner:
+        def __init__(self, scene):
+            self.scene = scene
+            self.invalid = False
+
+    def setUp(self):
+        self.scene = SchedulerTest.DummyScene()
+        self.owner = SchedulerTest.DummyOwner(self.scene)
+        self.tic = 0
+        self.fired = []
+
+    def tearDown(self):
+        # Let the scheduler forget about the dummy scene.
+        self.scene.invalid = True
+
+    def callback(self):
+        self.fired.append(self.tic)
+
+    def run_tics(self, n):
+        for _ in range(n):
+            self.tic += 1
+            Scripts.scheduler.Scheduler().advance(self.scene)
+
+    def test_seconds(self):
+        rate = bge.logic.getLogicTicRate()
+        Scripts.scheduler.Scheduler().call_after_seconds(0.5, self.callback,
+                owner=self.owner)
+        self.run_tics(int(rate) + 1)
+        self.assertEquals(self.fired, [round(0.5 * rate)])
+
+    def test_suspended(self):
+        Scripts.scheduler.Scheduler().call_later(3, self.callback,
+                owner=self.owner)
+        self.run_tics(2)
+        self.scene.suspended = True
+        self.run_tics(10)
+        self.assertEquals(self.fired, [])
+        self.scene.suspended = False
+        self.run_tics(2)
+        self.assertEquals(self.fired, [13])
+
+    def test_dead_owner(self):
+        Scripts.scheduler.Scheduler().call_later(3, self.callback,
+                owner=self.owner)
+        self.owner.invalid = True
+        self.run_tics(5)
+        self.assertEquals(self.fired, [])
+
+    def test_pre_draw(self):
+        # Scenes that don't call update are advanced when they are drawn.
+        Scripts.scheduler.Scheduler().call_later(3, self.callback,
+                owner=self.owner)
+        self.assertEquals(len(self.scene.pre_draw), 1)
+        for self.tic in range(1, 5):
+            for callback in self.scene.pre_draw:
+                callback()
+        self.assertEquals(self.fired, [3])
+
+    def test_driven(self):
+        Scripts.scheduler.Scheduler().call_later(3, self.callback,
+                owner=self.owner)
+        self.tic = 1
+        Scripts.scheduler.Scheduler().drive(self.scene)
+        self.assertEquals(self.scene.pre_draw, [])
+        for self.tic in range(2, 5):
+            Scripts.scheduler.Scheduler().drive(self.scene)
+        self.assertEquals(self.fired, [3])
+
+class LeafSpringTest(unittest.TestCase):
+    '''Scripts.bendyleaf.LeafSpring'''
+
+    class DummyLeaf:
+        def __init__(self, scene, restAfter):
+            self.scene = scene
+            self.invalid = False
+            self.steps = 0
+            self.restAfter = restAfter
+
+        def step(self):
+            self.steps += 1
+            return self.steps < self.restAfter
+
+    def setUp(self):
+        self.scene = SchedulerTest.DummyScene()
+
+    def tearDown(self):
+        self.scene.invalid = True
+
+    def run_tics(self, n):
+        for _ in range(n):
+            Scripts.scheduler.Scheduler().advance(self.scene)
+
+    def test_end_first_leaf(self):
+        leaves = [LeafSpringTest.DummyLeaf(self.scene, 100) for _ in range(3)]
+        for leaf in leaves:
+            Scripts.bendyleaf.LeafSpring().wake(leaf)
+        self.run_tics(2)
+        self.assertEquals([l.steps for l in leaves], [2, 2, 2])
+
+        # The leaf that was woken first is ended, e.g. by an LOD tree.
+        leaves[0].invalid = True
+        self.run_tics(3)
+        self.assertEquals([l.steps for l in leaves[1:]], [5, 5])
+
+    def test_rest(self):
+        leaf = LeafSpringTest.DummyLeaf(self.scene, 3)
+        Scripts.bendyleaf.LeafSpring().wake(leaf)
+        self.run_tics(10)
+        self.assertEquals(leaf.steps, 3)
+
+        # Waking again after coming to rest.
+        leaf.restAfter = 5
+        Scripts.bendyleaf.LeafSpring().wake(leaf)
+        self.run_tics(10)
+        self.assertEquals(leaf.steps, 5)
+
+class SimplexNoiseTest(unittest.TestCase):
+    '''Scripts.webgl_noise.snoise'''
+
+    POINTS = [(0.0, 0.0), (0.3, 0.7), (-12.5, 40.25), (288.9, -289.1),
+            (1000.0, 17.0), (3.14159, -2.71828)]
+
+    # Values of the GLSL snoise function at POINTS, from a line-by-line
+    # transcription of the shader source (in double precision).
+    REFERENCE = [0.0, -0.442620497480239, 0.603344051398311,
+            -0.544770085920392, -0.697759219390234, -0.717825180085714]
+
+    def test_range(self):
+        for x, y in SimplexNoiseTest.POINTS:
+            n = Scripts.webgl_noise.snoise_point(x, y)
+            self.assertTrue(-1.0 <= n <= 1.0)
+
+    def test_reference(self):
+        for (x, y), expected in zip(SimplexNoiseTest.POINTS,
+                SimplexNoiseTest.REFERENCE):
+            self.assertAlmostEqual(Scripts.webgl_noise.snoise_point(x, y),
+                    expected, places=9)
+
+    def test_vectorised(self):
+        # Uses NumPy if it's available; otherwise, tests the fallback.
+        values = Scripts.webgl_noise.snoise(SimplexNoiseTest.POINTS)
+        self.assertEquals(len(values), len(SimplexNoiseTest.POINTS))
+        for (x, y), n in zip(SimplexNoiseTest.POINTS, values):
+            self.assertAlmostEqual(n, Scripts.webgl_noise.snoise_point(x, y))
+        for n, expected in zip(values, SimplexNoiseTest.REFERENCE):
+            self.assertAlmostEqual(n, expected, places=9)
+
+class TextLayoutTest(unittest.TestCase):
+    '''Scripts.text_layout.lay_out'''
+
+    def setUp(self):
+        glyphs = {}
+        for char in 'abc -':
+            glyphs[char] = Scripts.text_layout.GlyphMetrics(char, 1.0, 0.0,
+                    0.0, 1.0)
+        glyphs['newline'] = Scripts.text_layout.GlyphMetrics('newline', 0.0,
+                0.0, 0.0, 1.0)
+        glyphs['undefined'] = Scripts.text_layout.GlyphMetrics('undefined',
+                1.0, 0.0, 0.0, 1.0)
+        self.font = Scripts.text_layout.FontMetrics('test', 1.0, 0.0, 0.0,
+                1.0, glyphs)
+
+    def lay_out(self, text, lineWidth, align='left'):
+        glyphString = self.font.text_to_glyphs(text)
+        return Scripts.text_layout.lay_out(glyphString, self.font, lineWidth,
+                align)
+
+    def test_escape(self):
+        chars = [g.char for g in self.font.text_to_glyphs('a\\[foo]\\nb')]
+        self.assertEquals(chars, ['a', 'undefined', 'newline', 'b'])
+
+    def test_single_line(self):
+        layout = self.lay_out('abc', 10.0)
+        self.assertEquals(layout.lines, 1)
+        self.assertEquals(layout.width, 3.0)
+        self.assertEquals([pos for _, _, pos in layout.glyphs],
+                [(0.0, 0.0), (1.0, 0.0), (2.0, 0.0)])
+
+    def test_wrap_at_space(self):
+        layout = self.lay_out('abc abc', 5.0)
+        self.assertEquals(layout.lines, 2)
+        # The space is swallowed by the line break.
+        self.assertEquals([g.char for g, _, _ in layout.glyphs], list('abcabc'))
+        self.assertEquals(layout.glyphs[3][2], (0.0, -1.0))
+
+    def test_newline(self):
+        layout = self.lay_out('ab\nc', 10.0)
+        self.assertEquals(layout.lines, 2)
+        self.assertEquals(layout.glyphs[-1][2], (0.0, -1.0))
+
+    def test_align_right(self):
+        layout = self.lay_out('abc', 10.0, align='right')
+        self.assertEquals(layout.glyphs[0][2], (-3.0, 0.0))
+
 def run_tests():
     suite = unittest.TestSuite()
     suite.addTests(unittest.TestLoader().loadTestsFromTestCase(PriorityStackTest))
     suite.addTests(unittest.TestLoader().loadTestsFromTestCase(FuzzySwitchTest))
+    suite.addTests(unittest.TestLoader().loadTestsFromTestCase(PathSearchTest))
+    suite.addTests(unittest.TestLoader().loadTestsFromTestCase(VisibilityTableTest))
+    suite.addTests(unittest.TestLoader().loadTestsFromTestCase(TimingWheelTest))
+    suite.addTests(unittest.TestLoader().loadTestsFromTestCase(SchedulerTest))
+    suite.addTests(unittest.TestLoader().loadTestsFromTestCase(LeafSpringTest))
+    suite.addTests(unittest.TestLoader().loadTestsFromTestCase(SimplexNoiseTest))
+    suite.addTests(unittest.TestLoader().loadTestsFromTestCase(TextLayoutTest))
     unittest.TextTestRunner(verbosity=2).run(suite)
@@ -0,0 +1,250 @@
+#
+# Copyright 2009-2012 Alex Fraser <alex@phatcore.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+'''
+Font metrics and text layout for Scripts.ui.Text. Nothing here depends on the
+game engine: fonts are read from game objects once, and from then on layout
+works on plain Python data. So this module can be tested and benchmarked
+outside of Blender.
+'''
+
+from collections import namedtuple
+
+GlyphMetrics = namedtuple('GlyphMetrics', ['char', 'width', 'xOffset',
+        'yOffset', 'delayMultiplier'])
+
+# A laid-out string. glyphs is a list of (GlyphMetrics, width, (x, y)) tuples.
+Layout = namedtuple('Layout', ['glyphs', 'lines', 'width', 'height',
+        'bottom'])
+
+WHITESPACE = {'newline', ' ', 'tab'}
+BREAKAFTER = {'-', '+', '.', ',', '!', ':', ';', ')', ']', '>', '*', '_', '?', '/', '=', '@'}
+
+class FontMetrics:
+    '''The dimensions of a font and its glyphs.'''
+
+    def __init__(self, name, lineHeight, baselineOffset, bottomOffset,
+            typingSpeed, glyphs):
+        self.name = name
+        self.lineHeight = lineHeight
+        self.baselineOffset = baselineOffset
+        self.bottomOffset = bottomOffset
+        self.typingSpeed = typingSpeed
+        self.glyphs = glyphs
+
+    @classmethod
+    def from_font(cls, font):
+        '''Read the metrics of a font object (as found in Text.blend). Each
+        child of the font is a glyph.'''
+        glyphs = {}
+        for child in font.children:
+            glyphs[child['char']] = GlyphMetrics(child['char'],
+                    child['Width'], child['xOffset'], child['yOffset'],
+                    child['DelayMultiplier'])
+        return cls(font.name, font['lineHeight'], font['baselineOffset'],
+                font['bottomOffset'], font['typingSpeed'], glyphs)
+
+    def get_glyph(self, char):
+        '''Return the glyph that matches 'char'. If no match is found, the
+        'undefined' glyph is returned (typically a box).'''
+        try:
+            return self.glyphs[char]
+        except KeyError:
+            return self.glyphs['undefined']
+
+    def text_to_glyphs(self, text):
+        '''
+        Convert a string of text into glyphs. Escape sequences are converted.
+        E.G the string '\\[foo]' will be converted into one glyph with the name
+        'foo'.
+
+        Returns: a list of glyphs.
+        '''
+        glyphString = []
+        i = 0
+        while i < len(text):
+            char = text[i]
+            seqLen = 1
+            if char == '\\':
+                char, seqLen = decode_escape_sequence(text, i)
+            elif char == '\n':
+                # Literal newline.
+                char = 'newline'
+            glyphString.append(self.get_glyph(char))
+            i = i + seqLen
+        return glyphString
+
+def decode_escape_sequence(text, start):
+    '''Decode an escape sequence from a string. Escape sequences begin with
+    a backslash. '\\\\' is decoded into a single backslash. A backslash
+    followed by a pair of matching square brackets decodes into the string
+    between the brackets. Anything else is illegal, and the key 'undefined'
+    will be returned.
+
+    Returns: the decoded glyph key and the length of the complete escape
+    sequence.
+    '''
+    seqLen = 1
+    key = None
+    if text[start + 1] == '\\':
+        key = '\\'
+        seqLen = 2
+    elif text[start + 1] == 'n':
+        # Escaped newline.
+        key = 'newline'
+        seqLen = 2
+    elif text[start + 1] == 't':
+        # Escaped newline.
+        key = 'tab'
+        seqLen = 2
+    elif text[start + 1] == '[':
+        try:
+            end = text.index(']', start + 2)
+            key = text[start + 2: end]
+            seqLen = (end + 1) - start
+        except ValueError:
+            key = 'undefined'
+            seqLen = 2
+    else:
+        key = 'undefined'
+        seqLen = 1
+
+    return key, seqLen
+
+def find_soft_breaks(chars):
+    '''Find the soft break opportunities for every position in a string, in
+    one pass (from the end). softBreaks[i] is the index of the first glyph at
+    or after i that a line may be broken before.'''
+    n = len(chars)
+    softBreaks = [n] * (n + 1)
+    nextBreak = n
+    for i in range(n - 1, -1, -1):
+        char = chars[i]
+        if char in WHITESPACE:
+            nextBreak = i
+        elif char in BREAKAFTER:
+            nextBreak = i + 1
+        softBreaks[i] = nextBreak
+    return softBreaks
+
+def find_break_point(lineWidth, chars, widths, start):
+    """Find the break point for a string of text. Always taken from
+    the start of the line (only call this when starting a new
+    line)."""
+    totalWidth = 0.0
+    for i in range(start, len(chars)):
+        totalWidth = totalWidth + widths[i]
+        if totalWidth > lineWidth or chars[i] == 'newline':
+            return i + 1
+
+    # No break required: string is not long enough.
+    return len(chars) + 1
+
+def align_left(glyph_line, width):
+    return glyph_line
+
+def align_centre(glyph_line, width):
+    line = []
+    offset = width * 0.5
+    for glyph, width, (gx, gy) in glyph_line:
+        gx -= offset
+        line.append((glyph, width, (gx, gy)))
+    return line
+
+def align_right(glyph_line, width):
+    line = []
+    offset = width
+    for glyph, width, (gx, gy) in glyph_line:
+        gx -= offset
+        line.append((glyph, width, (gx, gy)))
+    return line
+
+ALIGN_FUNCTIONS = {
+    'left': align_left,
+    'centre': align_centre,
+    'center': align_centre,
+    'right': align_right,
+    }
+
+def lay_out(glyphString, font, lineWidth, align='left', valign='bottom'):
+    '''
+    Arrange glyphs into lines.
+    @param glyphString: The glyphs to lay out (see FontMetrics.text_to_glyphs).
+    @param font: The FontMetrics of the glyphs.
+    @param lineWidth: The maximum width of a line.
+    @param align: 'left', 'centre' or 'right'.
+    @param valign: 'baseline' or 'bottom'.
+    @return: a Layout.
+    '''
+    align = ALIGN_FUNCTIONS[align]
+    lineHeight = font.lineHeight
+    if valign == 'baseline':
+        yOffset = font.baselineOffset
+    else:
+        yOffset = font.bottomOffset
+
+    chars = [g.char for g in glyphString]
+    widths = [g.width for g in glyphString]
+    softBreaks = find_soft_breaks(chars)
+
+    newLine = True
+    softBreakPoint = softBreaks[0]
+    hardBreakPoint = 0
+    laidOut = []
+    lines = 0
+    x = 0.0
+    y = 0.0
+    totalwidth = 0.0
+    current_line = []
+
+    for i, glyph in enumerate(glyphString):
+        width = widths[i]
+        if newLine:
+            hardBreakPoint = find_break_point(lineWidth, chars, widths, i)
+            newLine = False
+            lines += 1
+
+        if i == softBreakPoint:
+            # This glyph can have a line break before it. If the next
+            # such character is beyond the end of the line, break now.
+            softBreakPoint = softBreaks[i + 1]
+            if softBreakPoint >= hardBreakPoint:
+                newLine = True
+        elif i == hardBreakPoint:
+            # This glyph is beyond the end of the line. Break now.
+            newLine = True
+
+        if newLine:
+            # New line; carriage return.
+            laidOut.extend(align(current_line, x))
+            current_line = []
+            x = 0.0
+            y = y - lineHeight
+            if chars[i] in WHITESPACE:
+                # Advance to next character.
+                continue
+
+        gx = x + glyph.xOffset
+        gy = y + glyph.yOffset + yOffset
+        current_line.append((glyph, width, (gx, gy)))
+        x += width
+        if x > totalwidth:
+            totalwidth = x
+
+    laidOut.extend(align(current_line, x))
+
+    return Layout(laidOut, lines, totalwidth, -y + lineHeight, y + yOffset)
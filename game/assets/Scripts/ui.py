@@ -16,6 +16,7 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 #
 
+import collections
 import logging
 import time
 import random
@@ -23,6 +24,7 @@ import re
 
 import bge
 import mathutils
+import mathutils.geometry
 
 import bat.bats
 import bat.containers
@@ -32,6 +34,7 @@ import bat.render
 
 import Scripts.inventory
 import Scripts.director
+import Scripts.text_layout
 
 
 class HUDState(metaclass=bat.bats.Singleton):
@@ -581,15 +584,23 @@ class QuitOptions(bat.impulse.Handler, bat.bats.BX_GameObject, bge.types.KX_Game
 class Marker(bat.bats.BX_GameObject, bge.types.KX_GameObject):
     _prefix = 'Ma_'
 
+    log = logging.getLogger(__name__ + '.Marker')
+
     S_INIT = 1
     S_ACTIVE = 2
     S_INACTIVE = 3
 
     L_DISPLAY = 0
 
+    # The marker is only shown if the plane is this close to the camera.
+    MAX_DISTANCE = 100.0
+
     target = bat.containers.weakprop("target")
+    plane = bat.containers.weakprop("plane")
 
     def __init__(self, old_owner):
+        self.plane = None
+        self.last_view = None
         self.hide()
 
 #        sce = bge.logic.getCurrentScene()
@@ -602,8 +613,9 @@ class Marker(bat.bats.BX_GameObject, bge.types.KX_GameObject):
 
     def on_event(self, evt):
         if evt.message == 'ShowMarker':
-            print(evt)
+            Marker.log.debug("Showing marker for %s", evt.body)
             self.target = evt.body
+            self.last_view = None
             if evt.body is not None:
                 self.show()
             else:
@@ -615,6 +627,19 @@ class Marker(bat.bats.BX_GameObject, bge.types.KX_GameObject):
     def hide(self):
         self.children['MarkerMesh'].visible = False
         self.set_state(Marker.S_INACTIVE)
+        self.last_view = None
+
+    def find_plane(self):
+        '''Find the object that the marker sits on: the one with a MarkerPlane
+        property.'''
+        if self.plane is None:
+            for ob in self.scene.objects:
+                if 'MarkerPlane' in ob:
+                    self.plane = ob
+                    break
+            else:
+                Marker.log.warn("No MarkerPlane object in scene %s", self.scene)
+        return self.plane
 
     @bat.bats.expose
     def update(self):
@@ -625,10 +650,19 @@ class Marker(bat.bats.BX_GameObject, bge.types.KX_GameObject):
 
         t_sce = bat.utils.get_scene(self.target)
         t_cam = t_sce.active_camera
+        cam = bge.logic.getCurrentScene().active_camera
+
+        # Only move the marker if something has changed.
+        view = (self.target.worldPosition.copy(), t_cam.worldTransform.copy(),
+                cam.worldTransform.copy(), bge.render.getWindowWidth(),
+                bge.render.getWindowHeight())
+        if view == self.last_view:
+            return
+        self.last_view = view
+
         viewpos = mathutils.Vector(t_cam.getScreenPosition(self.target))
         #print("Viewpos", viewpos)
 
-        cam = bge.logic.getCurrentScene().active_camera
         if cam.perspective:
             vec = cam.getScreenVect(viewpos.x, viewpos.y)
             #print("Vec", vec)
@@ -647,16 +681,39 @@ class Marker(bat.bats.BX_GameObject, bge.types.KX_GameObject):
             pos_from = bat.bmath.to_world(cam, pos_from)
             pos_through = pos_from + vec
         #print("Ray", pos_from, pos_through)
-        hitob, hitloc, _ = cam.rayCast(pos_through, pos_from, 100.0,
-                "MarkerPlane", 0, 1, 0)
+        hitloc = self.intersect_plane(pos_from, pos_through)
 
-        #print("Hit", hitob, hitloc)
-        if hitob is not None:
+        #print("Hit", hitloc)
+        if hitloc is not None:
             self.worldPosition = hitloc
             self.children['MarkerMesh'].visible = True
         else:
             self.children['MarkerMesh'].visible = False
 
+    def intersect_plane(self, pos_from, pos_through):
+        '''Find where a ray hits the marker plane. The plane is assumed to be
+        flat in its local XY plane; its extent is ignored.
+        @return: the point of intersection, or None if the ray misses.'''
+        plane = self.find_plane()
+        if plane is None:
+            return None
+
+        normal = plane.getAxisVect(bat.bmath.ZAXIS)
+        hitloc = mathutils.geometry.intersect_line_plane(pos_from, pos_through,
+                plane.worldPosition, normal)
+        if hitloc is None:
+            # Parallel to the plane.
+            return None
+
+        direction = pos_through - pos_from
+        offset = hitloc - pos_from
+        if offset.dot(direction) < 0.0:
+            # Plane is behind the camera.
+            return None
+        if offset.magnitude > Marker.MAX_DISTANCE:
+            return None
+        return hitloc
+
 
 class LoadingScreen(bat.bats.BX_GameObject, bge.types.BL_ArmatureObject):
     _prefix = 'LS_'
@@ -919,6 +976,18 @@ class MapWidget(bat.bats.BX_GameObject, bge.types.KX_GameObject):
     S_HIDING  = 3
     S_HIDDEN  = 4
 
+    # Size of the map image in pixels, if it can't be determined.
+    DEFAULT_IMAGE_SIZE = 512
+    # Smallest change in heading that will redraw the direction marker
+    # (radians).
+    HEADING_THRESHOLD = 0.01
+
+    # Decoded map images, by file name (an LRUCache, created on first use).
+    # The most recent few are kept, so returning to a level doesn't decode its
+    # map again; older ones are let go, along with their textures.
+    images = None
+    MAX_CACHED_IMAGES = 2
+
     goal = bat.containers.weakprop('goal')
 
     def __init__(self, old_owner):
@@ -926,11 +995,18 @@ class MapWidget(bat.bats.BX_GameObject, bge.types.KX_GameObject):
         self.force_hide = False
         self.init_uv()
         self.file_name = None
+        self.image_size = MapWidget.DEFAULT_IMAGE_SIZE
         self.scale = mathutils.Vector((100.0, 100.0))
         self.offset = mathutils.Vector((0.0, 0.0))
         self.zoom = 2.0
         self.goal = None
 
+        # State of the last update, to avoid redrawing when nothing has moved.
+        self.dirty = True
+        self.last_pos = None
+        self.last_heading = None
+        self.last_goal_pos = None
+
         bat.event.EventBus().add_listener(self)
         bat.event.EventBus().replay_last(self, 'GameModeChanged')
         bat.event.EventBus().replay_last(self, 'SetMap')
@@ -968,6 +1044,7 @@ class MapWidget(bat.bats.BX_GameObject, bge.types.KX_GameObject):
         self.scale = scale
         self.offset = offset
         self.zoom = zoom
+        self.dirty = True
 
     def load_image(self, file_name):
         if file_name == self.file_name:
@@ -978,7 +1055,7 @@ class MapWidget(bat.bats.BX_GameObject, bge.types.KX_GameObject):
         try:
             matid = bge.texture.materialID(canvas, 'MAMapPage')
             tex = bge.texture.Texture(canvas, matid)
-            source = bge.texture.ImageFFmpeg(bge.logic.expandPath(file_name))
+            source = self.get_image(file_name)
 
             # Texture must be freed now. The game engine seems to have a weakref
             # hook for this. This is annoying, because it breaks exception handling.
@@ -994,6 +1071,29 @@ class MapWidget(bat.bats.BX_GameObject, bge.types.KX_GameObject):
         bge.logic.maptex = tex
 
         self.file_name = file_name
+        try:
+            self.image_size = max(source.size)
+        except (AttributeError, TypeError, ValueError):
+            self.image_size = MapWidget.DEFAULT_IMAGE_SIZE
+        if self.image_size <= 0:
+            self.image_size = MapWidget.DEFAULT_IMAGE_SIZE
+        self.dirty = True
+
+    def get_image(self, file_name):
+        '''Get the image source for a map. The image is only decoded the first
+        time it is used; after that, the same source is given to each new
+        texture.'''
+        if MapWidget.images is None:
+            MapWidget.images = LRUCache(MapWidget.MAX_CACHED_IMAGES)
+
+        source = MapWidget.images.get(file_name)
+        if source is not None:
+            MapWidget.log.info("Using cached map image %s", file_name)
+            return source
+
+        source = bge.texture.ImageFFmpeg(bge.logic.expandPath(file_name))
+        MapWidget.images.put(file_name, source)
+        return source
 
     def map_goal_changed(self, scene=None):
         if scene is None:
@@ -1010,6 +1110,7 @@ class MapWidget(bat.bats.BX_GameObject, bge.types.KX_GameObject):
         else:
             goal = scene.objects[goal]
             self.goal = goal
+        self.dirty = True
 
     @bat.bats.expose
     def update(self):
@@ -1020,13 +1121,47 @@ class MapWidget(bat.bats.BX_GameObject, bge.types.KX_GameObject):
         # Make copies for faster access
         pos = player.worldPosition.copy()
         orn = player.worldOrientation.copy()
+        heading = orn.col[1].xy
         if self.goal:
             goal_pos = self.goal.worldPosition.copy()
         else:
             goal_pos = None
+
+        if not self.needs_update(pos, heading, goal_pos):
+            return
+        self.dirty = False
+        self.last_pos = pos
+        self.last_heading = heading
+        self.last_goal_pos = goal_pos
+
         self.centre_page(pos, goal_pos)
         self.rotate_marker(orn)
 
+    def needs_update(self, pos, heading, goal_pos):
+        '''Check whether the map would look any different if it were drawn
+        now. Movements smaller than one pixel of the map image are ignored.'''
+        if self.dirty or self.last_pos is None:
+            return True
+
+        # Distance in the world that is covered by one pixel of the map.
+        threshold = min(self.scale.x, self.scale.y) / (self.image_size * self.zoom)
+        if (pos.xy - self.last_pos.xy).magnitude > threshold:
+            return True
+
+        if (goal_pos is None) != (self.last_goal_pos is None):
+            return True
+        if goal_pos is not None:
+            if (goal_pos.xy - self.last_goal_pos.xy).magnitude > threshold:
+                return True
+
+        if heading.magnitude > 0.0 and self.last_heading.magnitude > 0.0:
+            if heading.angle(self.last_heading) > MapWidget.HEADING_THRESHOLD:
+                return True
+        elif heading != self.last_heading:
+            return True
+
+        return False
+
     def init_uv(self):
         canvas = self.children['MapPage']
 
@@ -1088,6 +1223,7 @@ class MapWidget(bat.bats.BX_GameObject, bge.types.KX_GameObject):
             # These will be changed during update
             self.children['MapGoal'].visible = False
             self.children['MapGoalDirection'].visible = False
+            self.dirty = True
 
     def hide(self):
         if self.has_state(self.S_VISIBLE):
@@ -1433,6 +1569,167 @@ class ControlsInfo(bat.impulse.Handler, bat.bats.BX_GameObject, bge.types.KX_Gam
         icon.localScale = (scale,) * 3
 
 
+class LRUCache:
+    '''A dictionary that holds a limited number of items. When it is full, the
+    item that was used least recently is discarded.'''
+
+    def __init__(self, size):
+        self.size = size
+        self.items = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        try:
+            value = self.items[key]
+        except KeyError:
+            self.misses += 1
+            return default
+        self.items.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        self.items[key] = value
+        self.items.move_to_end(key)
+        while len(self.items) > self.size:
+            self.items.popitem(last=False)
+
+    def __len__(self):
+        return len(self.items)
+
+class GlyphPool(metaclass=bat.bats.Singleton):
+    '''
+    Keeps glyph instances that are no longer displayed, so they can be reused
+    by the next text that needs the same glyph. There is one pool per glyph,
+    i.e. per character per font.
+
+    Pooled glyphs are unparented, hidden and moved out of the way (so they
+    can't be clicked on), and put in a state with no logic.
+    '''
+
+    log = logging.getLogger(__name__ + '.GlyphPool')
+
+    S_POOLED = 30
+    PARK_POSITION = mathutils.Vector((0.0, 0.0, -10000.0))
+
+    def __init__(self):
+        self.free = {}
+        self.nCreated = 0
+        self.nReused = 0
+
+    def acquire(self, glyph, canvas):
+        '''Get an instance of a glyph, making a new one if none is free. The
+        instance is parented to the canvas, but otherwise not set up.'''
+        instance = None
+        free = self.free.get(glyph)
+        while free:
+            instance = free.pop()
+            if not instance.invalid:
+                break
+            instance = None
+
+        if instance is None:
+            self._prune()
+            instance = bge.logic.getCurrentScene().addObject(glyph, canvas, 0)
+            instance['_glyph'] = glyph
+            self.nCreated += 1
+        else:
+            # Place the instance the same way addObject would have: at the
+            # canvas, with its scale multiplied by the canvas's.
+            instance.worldPosition = canvas.worldPosition
+            instance.worldOrientation = canvas.worldOrientation
+            instance.worldScale = [a * b for a, b in
+                    zip(glyph.localScale, canvas.worldScale)]
+            instance.visible = glyph.visible
+            self.nReused += 1
+
+        instance.setParent(canvas)
+        return instance
+
+    def release(self, instance):
+        '''Return an instance to the pool. Objects that didn't come from the
+        pool are destroyed.'''
+        if '_glyph' not in instance:
+            instance.endObject()
+            return
+
+        glyph = instance['_glyph']
+        if glyph.invalid:
+            instance.endObject()
+            self._prune()
+            return
+
+        instance.removeParent()
+        instance.visible = False
+        instance.worldPosition = GlyphPool.PARK_POSITION
+        bat.utils.set_state(instance, GlyphPool.S_POOLED)
+        try:
+            self.free[glyph].append(instance)
+        except KeyError:
+            self.free[glyph] = [instance]
+
+    def _prune(self):
+        '''Forget the pools of glyphs that no longer exist (e.g. because
+        their scene has ended).'''
+        for glyph in list(self.free.keys()):
+            if glyph.invalid:
+                del self.free[glyph]
+
+    def report(self):
+        total = self.nCreated + self.nReused
+        if total == 0:
+            return 'No glyphs used'
+        pooled = sum(len(free) for free in self.free.values())
+        return '%d glyphs created, %d reused (%.0f%%); %d pooled in %d pools' % (
+                self.nCreated, self.nReused, 100.0 * self.nReused / total,
+                pooled, len(self.free))
+
+
+class FontRegistry(metaclass=bat.bats.Singleton):
+    '''
+    Reads the metrics of each font the first time it is used, so that text can
+    be laid out without touching game objects. Fonts are the children of
+    objects in Text.blend; the glyph objects are still needed to draw the
+    text, and are looked up per scene.
+    '''
+
+    log = logging.getLogger(__name__ + '.FontRegistry')
+
+    def __init__(self):
+        self.metrics = {}
+        self.glyph_objects = {}
+
+    def get_metrics(self, name):
+        try:
+            return self.metrics[name]
+        except KeyError:
+            pass
+        font = bge.logic.getCurrentScene().objectsInactive[name]
+        metrics = Scripts.text_layout.FontMetrics.from_font(font)
+        FontRegistry.log.info('Read metrics of font %s (%d glyphs)', name,
+                len(metrics.glyphs))
+        self.metrics[name] = metrics
+        return metrics
+
+    def get_glyph_object(self, name, char):
+        '''Find the object that draws a glyph in the current scene.'''
+        sce = bge.logic.getCurrentScene()
+        key = (sce.name, name)
+        try:
+            font, glyphs = self.glyph_objects[key]
+            if font.invalid:
+                raise KeyError(key)
+        except KeyError:
+            font = sce.objectsInactive[name]
+            glyphs = dict((child['char'], child) for child in font.children)
+            self.glyph_objects[key] = (font, glyphs)
+        try:
+            return glyphs[char]
+        except KeyError:
+            return glyphs['undefined']
+
+
 class Text(bat.bats.BX_GameObject, bge.types.KX_GameObject):
     '''
     A TextRenderer is used to render glyphs from a Font. The object nominated as
@@ -1448,6 +1745,9 @@ class Text(bat.bats.BX_GameObject, bge.types.KX_GameObject):
     rendering to clear the canvas.
     '''
 
+    # Completed layouts, shared by all canvases.
+    layout_cache = LRUCache(256)
+
     def __init__(self, old_owner):
         self.set_default_prop('Content', '')
         self.set_default_prop('colour', 'black')
@@ -1463,8 +1763,12 @@ class Text(bat.bats.BX_GameObject, bge.types.KX_GameObject):
         self.clear()
 
     def clear(self):
-        for child in self.children:
-            child.endObject()
+        pool = GlyphPool()
+        children = list(self.children)
+        for child in children:
+            pool.release(child)
+        if len(children) > 0:
+            GlyphPool.log.debug(pool.report())
 
         self.glyphString = []
         self.delay = 0.0
@@ -1473,206 +1777,49 @@ class Text(bat.bats.BX_GameObject, bge.types.KX_GameObject):
 
     def text_to_glyphs(self, text):
         '''
-        Convert a string of text into glyph tuples. Escape sequences are
-        converted. E.G the string '\[foo]' will be converted into one glyph with
-        the name 'foo'.
+        Convert a string of text into glyphs. Escape sequences are converted.
+        See Scripts.text_layout.FontMetrics.text_to_glyphs.
 
         Returns: a list of glyphs.
         '''
-
-        glyphString = []
-        i = 0
-        while i < len(text):
-            char = text[i]
-            seqLen = 1
-            if char == '\\':
-                char, seqLen = self.decode_escape_sequence(text, i)
-            elif char == '\n':
-                # Literal newline.
-                char = 'newline'
-            glyphString.append(self.get_glyph(char))
-            i = i + seqLen
-        return glyphString
+        return self.get_font().text_to_glyphs(text)
 
     def decode_escape_sequence(self, text, start):
-        '''Decode an escape sequence from a string. Escape sequences begin with
-        a backslash. '\\' is decoded into a single backslash. A backslash
-        followed by a pair of matching square brackets decodes into the string
-        between the brackets. Anything else is illegal, and the key 'undefined'
-        will be returned.
-
-        Returns: the decoded glyph key and the length of the complete escape
-        sequence.
-        '''
-        seqLen = 1
-        key = None
-        if text[start + 1] == '\\':
-            key = '\\'
-            seqLen = 2
-        elif text[start + 1] == 'n':
-            # Escaped newline.
-            key = 'newline'
-            seqLen = 2
-        elif text[start + 1] == 't':
-            # Escaped newline.
-            key = 'tab'
-            seqLen = 2
-        elif text[start + 1] == '[':
-            try:
-                end = text.index(']', start + 2)
-                key = text[start + 2: end]
-                seqLen = (end + 1) - start
-            except ValueError:
-                key = 'undefined'
-                seqLen = 2
-        else:
-            key = 'undefined'
-            seqLen = 1
-
-        return key, seqLen
+        return Scripts.text_layout.decode_escape_sequence(text, start)
 
     def get_glyph(self, char):
-        '''Return the glyph tuple that matches 'char'. If no match is found, the
-        'undefined' glyph is returned (typically a box).
-
-        Returns: glyph object
-        '''
-        font = self.get_font()
-        glyphDict = font['_glyphDict']
-        try:
-            return glyphDict[char]
-        except KeyError:
-            return glyphDict['undefined']
+        '''Return the glyph metrics that match 'char'. If no match is found,
+        the 'undefined' glyph is returned (typically a box).'''
+        return self.get_font().get_glyph(char)
 
     def get_font(self):
-        font = bge.logic.getCurrentScene().objectsInactive[self['Font']]
-        if not '_glyphDict' in font:
-            self.parse_font(font)
-        return font
-
-    def parse_font(self, font):
-        glyphDict = {}
-        for child in font.children:
-            glyphDict[child['char']] = child
-        font['_glyphDict'] = glyphDict
-
-    WHITESPACE = {'newline', ' ', 'tab'}
-    BREAKAFTER = {'-', '+', '.', ',', '!', ':', ';', ')', ']', '>', '*', '_', '?', '/', '=', '@'}
-
-    def find_next_breakable_char(self, glyphString, start):
-        '''Find soft break'''
-        for i in range(start, len(glyphString)):
-            if glyphString[i]['char'] in Text.WHITESPACE:
-                return i
-            elif glyphString[i]['char'] in Text.BREAKAFTER:
-                return i + 1
-
-        # No more breakable characters.
-        return len(glyphString)
-
-    def find_next_break_point(self, lineWidth, glyphString, start):
-        """Find the break point for a string of text. Always taken from
-        the start of the line (only call this when starting a new
-        line)."""
-        totalWidth = 0.0
-        for i in range(start, len(glyphString)):
-            glyph = glyphString[i]
-            totalWidth = totalWidth + glyph['Width']
-            if totalWidth > lineWidth or glyph['char'] == 'newline':
-                return i + 1
-
-        # No break required: string is not long enough.
-        return len(glyphString) + 1
-
-    def align_left(self, glyph_line, width):
-        return glyph_line
-
-    def align_centre(self, glyph_line, width):
-        line = []
-        offset = width * 0.5
-        for glyph, width, (gx, gy) in glyph_line:
-            gx -= offset
-            line.append((glyph, width, (gx, gy)))
-        return line
-
-    def align_right(self, glyph_line, width):
-        line = []
-        offset = width
-        for glyph, width, (gx, gy) in glyph_line:
-            gx -= offset
-            line.append((glyph, width, (gx, gy)))
-        return line
+        return FontRegistry().get_metrics(self['Font'])
 
     def lay_out_text(self, glyphString):
-        newLine = True
-        softBreakPoint = self.find_next_breakable_char(glyphString, 0)
-        hardBreakPoint = 0
-        self.glyphString = []
-        x = 0.0
-        y = 0.0
-        font = self.get_font()
-        totalwidth = 0.0
-        current_line = []
-
-        if 'align' not in self:
-            align = self.align_left
-        elif self['align'] == 'left':
-            align = self.align_left
-        elif self['align'] in {'centre', 'center'}:
-            align = self.align_centre
-        elif self['align'] == 'right':
-            align = self.align_right
-
-        for i, glyph in enumerate(glyphString):
-            width = glyph['Width']
-            if newLine:
-                hardBreakPoint = self.find_next_break_point(
-                    self['LineWidth'], glyphString, i)
-                newLine = False
-                self.lines += 1
-
-            if i == softBreakPoint:
-                # This glyph can have a line break before it. If the next
-                # such character is beyond the end of the line, break now.
-                softBreakPoint = self.find_next_breakable_char(glyphString,
-                    i + 1)
-                if softBreakPoint >= hardBreakPoint:
-                    newLine = True
-            elif i == hardBreakPoint:
-                # This glyph is beyond the end of the line. Break now.
-                newLine = True
-
-            if newLine:
-                # New line; carriage return.
-                self.glyphString.extend(align(current_line, x))
-                current_line = []
-                x = 0.0
-                y = y - font['lineHeight']
-                if glyph['char'] in Text.WHITESPACE:
-                    # Advance to next character.
-                    continue
-
-            gx = x + glyph['xOffset']
-            gy = y + glyph['yOffset']
-            if self['valign'] == 'baseline':
-                gy += font['baselineOffset']
-            else:
-                gy += font['bottomOffset']
-            pos = (gx, gy)
-            current_line.append((glyph, width, pos))
-            x += width
-            if x > totalwidth:
-                totalwidth = x
-
-        self.glyphString.extend(align(current_line, x))
-
-        totalheight = -y + font['lineHeight']
-        self.textwidth = totalwidth
-        self.textheight = totalheight
-        if self['valign'] == 'baseline':
-            self.textbottom = y + font['baselineOffset']
-        else:
-            self.textbottom = y + font['bottomOffset']
+        layout = Scripts.text_layout.lay_out(glyphString, self.get_font(),
+                self['LineWidth'], self.get('align', 'left'), self['valign'])
+        self.apply_layout(layout)
+        return layout
+
+    def apply_layout(self, layout):
+        self.glyphString = layout.glyphs
+        self.lines += layout.lines
+        self.textwidth = layout.width
+        self.textheight = layout.height
+        self.textbottom = layout.bottom
+
+    def lay_out_content(self):
+        '''Lay out the Content. Layouts are cached, so text that has been
+        shown before (with the same font and settings) is not laid out again.'''
+        key = (self['Content'], self['Font'], self['LineWidth'],
+                self.get('align', 'left'), self['valign'])
+        layout = Text.layout_cache.get(key)
+        if layout is not None:
+            self.apply_layout(layout)
+            return
+
+        layout = self.lay_out_text(self.text_to_glyphs(self['Content']))
+        Text.layout_cache.put(key, layout)
 
     OUTLINE_WIDTH = 0.01
     OUTLINE_ZOFF = 0.001
@@ -1700,7 +1847,9 @@ class Text(bat.bats.BX_GameObject, bge.types.KX_GameObject):
             state = 4
         else:
             state = 3
-            self.delay = (font['typingSpeed'] * width * glyph['DelayMultiplier'])
+            self.delay = (font.typingSpeed * width * glyph.delayMultiplier)
+
+        glyph = FontRegistry().get_glyph_object(self['Font'], glyph.char)
 
         colour = bat.render.parse_colour(self['colour'])
         if 'outline' not in self:
@@ -1718,8 +1867,7 @@ class Text(bat.bats.BX_GameObject, bge.types.KX_GameObject):
                 self._instanitate_glyph(glyph, pos2, col, state)
 
     def _instanitate_glyph(self, glyph, pos, colour, state):
-        glyphInstance = bge.logic.getCurrentScene().addObject(glyph, self, 0)
-        glyphInstance.setParent(self)
+        glyphInstance = GlyphPool().acquire(glyph, self)
         glyphInstance['StartVisible'] = self.visible
         glyphInstance.color = colour
         glyphInstance.localPosition = pos
@@ -1760,7 +1908,7 @@ class Text(bat.bats.BX_GameObject, bge.types.KX_GameObject):
 
         self.clear()
 
-        self.lay_out_text(self.text_to_glyphs(self['Content']))
+        self.lay_out_content()
         self['Rendering'] = True
 
         if self['Instant']:
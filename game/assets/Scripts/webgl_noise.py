@@ -1,3 +1,10 @@
+import math
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 NOISE_FN = """
 
 //
@@ -71,3 +78,96 @@ float snoise(vec2 v)
   return 130.0 * dot(m, g);
 }
 """
+
+#
+# A Python version of the snoise function above, for use outside of shaders
+# (e.g. to move objects in the same way as windy vertices, or to check shader
+# changes offline). Operates on NumPy arrays, so many points can be evaluated
+# in one call.
+#
+
+C = (0.211324865405187,  # (3.0-sqrt(3.0))/6.0
+     0.366025403784439,  # 0.5*(sqrt(3.0)-1.0)
+    -0.577350269189626,  # -1.0 + 2.0 * C.x
+     0.024390243902439)  # 1.0 / 41.0
+
+def _mod289(x, floor):
+    return x - floor(x * (1.0 / 289.0)) * 289.0
+
+def _permute(x, floor):
+    return _mod289(((x * 34.0) + 1.0) * x, floor)
+
+def _corner(p, x, y, floor, maximum):
+    '''Contribution of one corner of the simplex.'''
+    m = maximum(0.5 - (x * x + y * y), 0.0)
+    m = m * m
+    m = m * m
+
+    # Gradients: 41 points uniformly over a line, mapped onto a diamond.
+    gx = p * C[3]
+    gx = 2.0 * (gx - floor(gx)) - 1.0
+    h = abs(gx) - 0.5
+    a0 = gx - floor(gx + 0.5)
+
+    # Normalise gradients implicitly by scaling m
+    m = m * (1.79284291400159 - 0.85373472095314 * (a0 * a0 + h * h))
+    return m * (a0 * x + h * y)
+
+def _snoise(vx, vy, floor, maximum):
+    # First corner
+    s = (vx + vy) * C[1]
+    ix = floor(vx + s)
+    iy = floor(vy + s)
+    t = (ix + iy) * C[0]
+    x0 = vx - ix + t
+    y0 = vy - iy + t
+
+    # Other corners
+    i1x = (x0 > y0) * 1.0
+    i1y = 1.0 - i1x
+    x1 = x0 + C[0] - i1x
+    y1 = y0 + C[0] - i1y
+    x2 = x0 + C[2]
+    y2 = y0 + C[2]
+
+    # Permutations
+    ix = _mod289(ix, floor)
+    iy = _mod289(iy, floor)
+    p0 = _permute(_permute(iy, floor) + ix, floor)
+    p1 = _permute(_permute(iy + i1y, floor) + ix + i1x, floor)
+    p2 = _permute(_permute(iy + 1.0, floor) + ix + 1.0, floor)
+
+    return 130.0 * (_corner(p0, x0, y0, floor, maximum) +
+            _corner(p1, x1, y1, floor, maximum) +
+            _corner(p2, x2, y2, floor, maximum))
+
+def snoise_point(x, y):
+    '''Evaluate the noise function at a single point. Slow; use snoise for
+    more than a handful of points.'''
+    return _snoise(float(x), float(y), math.floor, max)
+
+def snoise(v):
+    '''
+    Evaluate the noise function at many points at once. The result matches the
+    GLSL snoise function (to within the precision of the GPU).
+    @param v: The points to evaluate, as an array with shape (..., 2).
+    @return: An array of noise values with shape (...), in the range [-1, 1].
+    '''
+    if numpy is None:
+        return [snoise_point(x, y) for x, y in v]
+    v = numpy.asarray(v, dtype=numpy.float64)
+    return _snoise(v[..., 0], v[..., 1], numpy.floor, numpy.maximum)
+
+def displacement(v):
+    '''
+    Evaluate three channels of noise at many points, as done by the windy
+    shader to displace vertices (see Scripts.shaders.set_windy).
+    @param v: The points to evaluate, as an array with shape (..., 2).
+    @return: An array with shape (..., 3).
+    '''
+    if numpy is None:
+        return [(snoise_point(x, y), snoise_point(x + 17.0, y + 17.0),
+                snoise_point(x - 43.0, y - 43.0)) for x, y in v]
+    v = numpy.asarray(v, dtype=numpy.float64)
+    return numpy.stack((snoise(v), snoise(v + 17.0), snoise(v - 43.0)),
+            axis=-1)